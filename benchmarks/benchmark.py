@@ -0,0 +1,205 @@
+#! /usr/bin/env python3
+
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import timeit
+import numpy as np
+from PIL import Image
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from hmm import trainer
+from preprocessing.binarization import binarize
+from preprocessing.skeletonize import skeletonize, skeletonize_array
+from preprocessing.zoningwriter import get_values, get_values_batch
+from utils.mnstreader import read_images, read_labels
+
+def time_cases(cases, rounds = 10):
+    '''Seconds per call of each case, the median of several rounds that
+    each loop the call for at least 0.2 seconds. The rounds take turns
+    over all the cases, so a slow spell of the machine lands on only a
+    few runs of each case.
+
+    cases -- name: (function, scale), scale multiplying the time
+    '''
+    timers = {name: timeit.Timer(function) for name, (function, scale) in cases.items()}
+    numbers = {name: timer.autorange()[0] for name, timer in timers.items()}
+    runs = {name: [] for name in cases}
+    for i in range(rounds):
+        for name, timer in timers.items():
+            runs[name].append(timer.timeit(numbers[name]) / numbers[name])
+    return {name: statistics.median(runs[name]) * scale for name, (function, scale) in cases.items()}
+
+def quiet(function):
+    '''function with its printing (train prints every epoch) swallowed'''
+    def call():
+        with contextlib.redirect_stdout(io.StringIO()):
+            return function()
+    return call
+
+def write_idx(filename, array):
+    '''Write a uint8 array as an IDX file'''
+    array = np.ascontiguousarray(array, dtype = np.uint8)
+    with open(filename, 'wb') as f:
+        f.write(bytes((0, 0, 8, array.ndim)))
+        for size in array.shape:
+            f.write(size.to_bytes(4, byteorder = 'big'))
+        f.write(array.tobytes())
+
+def synthetic_digits(count, rows = 28, cols = 28, seed = 0):
+    '''Random pen strokes on a blank background, stored like MNIST
+    (ink is high, background is 0), with a random label for each'''
+    rng = np.random.default_rng(seed)
+    images = np.zeros((count, rows, cols), dtype = np.uint8)
+    steps = np.linspace(0, 1, 2 * max(rows, cols))
+    for image in images:
+        for stroke in range(rng.integers(1, 4)):
+            (y0, x0), (y1, x1) = rng.uniform(4, (rows - 5, cols - 5), (2, 2))
+            y = np.rint(y0 + (y1 - y0) * steps).astype(int)
+            x = np.rint(x0 + (x1 - x0) * steps).astype(int)
+            for dy, dx in ((0, 0), (0, 1), (1, 0), (1, 1)):
+                image[y + dy, x + dx] = 255
+    labels = rng.integers(0, 10, count).astype(np.uint8)
+    return images, labels
+
+def model_cases(quick):
+    '''(topology, size, model) for every model the suite times'''
+    sizes = (8, 16) if quick else (8, 16, 32)
+    cases = []
+    for states in sizes:
+        cases.append(('full', states, trainer.make_model(states)))
+        cases.append(('linear', states, trainer.make_linear_model(states)))
+    for side in ((3, 5) if quick else (3, 5, 7)):
+        cases.append(('2d', side * side, trainer.make_2d_model(side, side, 1)))
+    return cases
+
+def model_timings(model, observed, sequences, hmms):
+    return {
+        'forward': lambda: model.forward(observed),
+        'backward': lambda: model.backward(observed),
+        'viterbi': lambda: model.viterbi(observed),
+        'baum_welsch': lambda: model.baum_welsch(observed),
+        'train': quiet(lambda: trainer.train(model, sequences, 1)),
+        'get_success_rate': lambda: trainer.get_success_rate(0, sequences, hmms),
+    }
+
+def benchmark_models(cases, quick):
+    random.seed(0)
+    length = 49
+    sequence_count = 10 if quick else 40
+    sequences = [[random.randrange(5) for t in range(length)] for i in range(sequence_count)]
+    observed = sequences[0]
+
+    for topology, states, model in model_cases(quick):
+        case = '{}-{}'.format(topology, states)
+        hmms = {label: quiet(lambda: trainer.train(model, sequences[label::2], 1))()
+                for label in range(2)}
+        for name, function in model_timings(model, observed, sequences, hmms).items():
+            cases[name + '/' + case] = (function, 1)
+
+def benchmark_preprocessing(cases, quick, directory):
+    count = 500 if quick else 5000
+    loop_count = 100 if quick else 500
+    size = (7, 7)
+    digits, labels = synthetic_digits(count)
+
+    image_file = os.path.join(directory, 'images-idx3-ubyte')
+    label_file = os.path.join(directory, 'labels-idx1-ubyte')
+    write_idx(image_file, digits)
+    write_idx(label_file, labels)
+
+    images = read_images(image_file)
+    grids = binarize(images[:loop_count], 127) ^ 1
+
+    def zone_loop():
+        for image in images[:loop_count]:
+            img = Image.new('L', image.shape[::-1])
+            img.putdata(image.ravel().tolist())
+            get_values(img, size)
+
+    def skeletonize_loop():
+        for grid in grids:
+            skeletonize(grid.tolist())
+
+    # loops over single images are timed on loop_count images and
+    # reported per count images, like the batch versions
+    scale = count / loop_count
+    timings = {
+        'read_images': (lambda: read_images(image_file, mmap = False), 1),
+        'read_labels': (lambda: read_labels(label_file, mmap = False), 1),
+        'get_values': (zone_loop, scale),
+        'get_values_batch': (lambda: get_values_batch(images, size), 1),
+        'skeletonize': (skeletonize_loop, scale),
+        'skeletonize_array': (lambda: skeletonize_array(binarize(images, 127) ^ 1), 1),
+    }
+    for name, timing in timings.items():
+        cases[name + '/' + str(count)] = timing
+
+def machine():
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+        'cpus': os.cpu_count(),
+    }
+
+def compare(results, baseline, tolerance, floor = 1e-5):
+    '''Print each timing against the baseline; returns the names that got
+    slower by more than tolerance (a fraction of the baseline time) and
+    by more than floor seconds, below which differences are noise'''
+    regressions = []
+    for name, seconds in results.items():
+        if name not in baseline:
+            continue
+        ratio = seconds / baseline[name] if baseline[name] else float('inf')
+        flag = ''
+        if ratio > 1 + tolerance and seconds - baseline[name] > floor:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print('{:>36} {:.6f}s -> {:.6f}s ({:.2f}x){}'.format(
+                name, baseline[name], seconds, ratio, flag))
+    return regressions
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description = 'Time inference, training and preprocessing')
+    parser.add_argument('-o', '--output', help = 'write results to this JSON file')
+    parser.add_argument('-b', '--baseline', help = 'compare against results saved with -o')
+    parser.add_argument('-t', '--tolerance', type = float, default = 0.25,
+            help = 'slowdown allowed before a timing counts as a regression')
+    parser.add_argument('-f', '--floor', type = float, default = 1e-5,
+            help = 'seconds a timing must slow by to count as a regression')
+    parser.add_argument('-q', '--quick', action = 'store_true',
+            help = 'smaller models and datasets')
+    args = parser.parse_args()
+
+    cases = {}
+    with tempfile.TemporaryDirectory() as directory:
+        benchmark_models(cases, args.quick)
+        benchmark_preprocessing(cases, args.quick, directory)
+        results = time_cases(cases)
+    for name, seconds in results.items():
+        print('{:>24} {:>10} {:.6f}s'.format(*name.split('/'), seconds))
+    report = {'machine': machine(), 'quick': args.quick, 'results': results}
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent = 2, sort_keys = True)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get('quick') != args.quick:
+            print('warning: baseline was run with quick = {}'.format(baseline.get('quick')))
+        regressions = compare(results, baseline['results'], args.tolerance, args.floor)
+        if regressions:
+            print('{} regressions'.format(len(regressions)))
+            sys.exit(1)
@@ -0,0 +1,143 @@
+#! /usr/bin/env python3
+
+import numpy as np
+from hmm.dense import CompiledModel, DenseModel, compile_model, length_buckets
+
+class ModelBank:
+    '''Per-class models stacked into one set of arrays, so a sequence is
+    scored against every class in a single forward pass.
+    Models are padded to a common state count; padding states have no
+    initial, transition or emission probability, so they are never entered.
+
+    names -- class label of each model, in bank order
+    symbols -- observation symbols shared by every model
+    pi -- initial probabilities, shape (models, states)
+    a -- transition probabilities, shape (models, states, states)
+    b -- emission probabilities, shape (models, states, symbols)
+    labels -- state labels of each model; defaults to state indices
+    '''
+
+    def __init__(self, names, symbols, pi, a, b, labels = None):
+        self.names = list(names)
+        self.symbols = list(symbols)
+        self.symbol_index = {s: i for i, s in enumerate(self.symbols)}
+        self.pi = np.asarray(pi, dtype = float)
+        self.a = np.asarray(a, dtype = float)
+        self.b = np.asarray(b, dtype = float)
+
+        models, states, _ = self.b.shape
+        if labels is None:
+            labels = [list(range(states)) for name in self.names]
+        self.labels = [list(l) for l in labels]
+
+        # emission rates indexed by symbol, with a trailing row of zeros
+        # for symbols no model knows
+        self.emission_rows = np.concatenate(
+                (self.b.transpose(0, 2, 1), np.zeros((models, 1, states))), axis = 1)
+
+    def __repr__(self):
+        return 'ModelBank({} models, {} states)'.format(
+                len(self.names), self.pi.shape[1])
+
+    def __len__(self):
+        return len(self.names)
+
+    def encode(self, observed):
+        '''Map observations to symbol indices; unknown symbols become -1'''
+        get = self.symbol_index.get
+        return np.fromiter((get(o, -1) for o in observed), dtype = np.intp,
+                count = len(observed))
+
+    def score(self, observed):
+        '''Log probability of a sequence under every model, in bank order'''
+        return self.batch_score([observed])[0]
+
+    def score_all(self, sequences, bucket_width = 16):
+        '''Log probabilities of many sequences, shape (sequences, models)
+
+        sequences -- list of observation sequences
+        bucket_width -- largest length difference within one batch
+        '''
+        output = np.empty((len(sequences), len(self.names)))
+        for indices in length_buckets(sequences, bucket_width):
+            output[indices] = self.batch_score([sequences[i] for i in indices])
+        return output
+
+    def batch_score(self, sequences):
+        '''Scaled forward recursion over a (models, batch, states) table'''
+        lengths = np.array([len(s) for s in sequences])
+        codes = np.full((len(sequences), lengths.max(initial = 0)), -1, dtype = np.intp)
+        for i, observed in enumerate(sequences):
+            codes[i, :lengths[i]] = self.encode(observed)
+
+        log_prob = np.zeros((len(self.names), len(sequences)))
+        for t in range(codes.shape[1]):
+            rates = self.emission_rows[:, codes[:, t]]
+            if t == 0:
+                column = self.pi[:, None, :] * rates
+            else:
+                column = np.matmul(column, self.a) * rates
+            scales = column.sum(axis = 2)
+            active = t < lengths
+            with np.errstate(divide = 'ignore'):
+                log_prob[:, active] += np.log(scales[:, active])
+            np.divide(column, scales[:, :, None], out = column,
+                    where = scales[:, :, None] != 0)
+
+        return log_prob.T
+
+    def classify(self, observed):
+        '''Name of the model most likely to have produced a sequence'''
+        return self.names[self.score(observed).argmax()]
+
+    def classify_all(self, sequences, bucket_width = 16):
+        scores = self.score_all(sequences, bucket_width)
+        return [self.names[i] for i in scores.argmax(axis = 1)]
+
+    def top_k(self, observed, k):
+        '''The k best models for a sequence as (name, log probability) pairs'''
+        scores = self.score(observed)
+        best = np.argsort(-scores, kind = 'stable')[:k]
+        return [(self.names[i], scores[i].item()) for i in best]
+
+    def model(self, name):
+        '''The DenseModel for one class, without its padding states'''
+        i = self.names.index(name)
+        states = len(self.labels[i])
+        return DenseModel(self.labels[i], self.symbols, self.pi[i, :states],
+                self.a[i, :states, :states], self.b[i, :states])
+
+def make_bank(models):
+    '''Stack a dict of class label -> model into a ModelBank.
+    Models may be HiddenMarkovModels or compiled models.
+    '''
+    compiled = {}
+    for name, model in models.items():
+        if not isinstance(model, CompiledModel):
+            model = compile_model(model)
+        compiled[name] = model
+
+    symbols = []
+    symbol_index = {}
+    for model in compiled.values():
+        for symbol in model.symbols:
+            if symbol not in symbol_index:
+                symbol_index[symbol] = len(symbols)
+                symbols.append(symbol)
+
+    count = len(compiled)
+    states = max((model.state_count() for model in compiled.values()), default = 0)
+    pi = np.zeros((count, states))
+    a = np.zeros((count, states, states))
+    b = np.zeros((count, states, len(symbols)))
+
+    for i, model in enumerate(compiled.values()):
+        n = model.state_count()
+        rows, cols = model.edges
+        columns = [symbol_index[s] for s in model.symbols]
+        pi[i, :n] = model.pi
+        a[i, rows, cols] = model.transition_rates()
+        b[i, :n][:, columns] = model.b
+
+    return ModelBank(compiled.keys(), symbols, pi, a, b,
+            [model.labels for model in compiled.values()])
@@ -0,0 +1,432 @@
+#! /usr/bin/env python3
+
+import numpy as np
+from hmm.hmm import HiddenMarkovModel
+from hmm.metrics import phase
+
+class CompiledModel:
+    '''Hidden Markov Model compiled into arrays.
+    Offers the same inference methods as HiddenMarkovModel; subclasses
+    decide how transitions are stored by implementing propagate, pullback,
+    best_predecessors, expected_transitions and transition_rates.
+
+    labels -- state labels, in index order
+    symbols -- observation symbols, in index order
+    pi -- initial probabilities, shape (states,)
+    b -- emission probabilities, shape (states, symbols)
+    edges -- (from indices, to indices) of the declared transitions
+    '''
+
+    def __init__(self, labels, symbols, pi, b, edges):
+        self.labels = list(labels)
+        self.symbols = list(symbols)
+        self.index = {label: i for i, label in enumerate(self.labels)}
+        self.symbol_index = {s: i for i, s in enumerate(self.symbols)}
+        self.pi = np.asarray(pi, dtype = float)
+        self.b = np.asarray(b, dtype = float)
+        self.edges = (np.asarray(edges[0], dtype = np.intp),
+                np.asarray(edges[1], dtype = np.intp))
+
+    def __repr__(self):
+        return '{}({} states, {} symbols)'.format(type(self).__name__,
+                len(self.labels), len(self.symbols))
+
+    def state_count(self):
+        return len(self.labels)
+
+    def encode(self, observed):
+        '''Map observations to symbol indices; unknown symbols become -1'''
+        get = self.symbol_index.get
+        return np.fromiter((get(o, -1) for o in observed), dtype = np.intp,
+                count = len(observed))
+
+    def emissions(self, observed):
+        '''Emission rate of every state at every time, shape (time, states)'''
+        codes = self.encode(observed)
+        rates = self.b[:, codes].T
+        rates[codes < 0] = 0
+        return rates
+
+    def to_table(self, table):
+        '''Convert an array table to the list of dicts HiddenMarkovModel uses'''
+        return [dict(zip(self.labels, row.tolist())) for row in table]
+
+    def forward(self, observed):
+        emissions = self.emissions(observed)
+        table = np.empty_like(emissions)
+
+        table[0] = self.pi * emissions[0]
+        for t in range(1, len(observed)):
+            table[t] = self.propagate(table[t - 1]) * emissions[t]
+
+        return table
+
+    def backward(self, observed):
+        emissions = self.emissions(observed)
+        table = np.empty_like(emissions)
+
+        table[-1] = 1
+        for t in range(len(observed) - 2, -1, -1):
+            table[t] = self.pullback(emissions[t + 1] * table[t + 1])
+
+        return table
+
+    def scaled_forward(self, observed, emissions = None):
+        '''Forward algorithm with every time step normalized to sum to 1.
+        Returns the table and the normalizer used at each time step.
+        '''
+        if emissions is None:
+            emissions = self.emissions(observed)
+        table = np.empty_like(emissions)
+        scales = np.empty(len(observed))
+
+        column = self.pi * emissions[0]
+        for t in range(len(observed)):
+            if t:
+                column = self.propagate(table[t - 1]) * emissions[t]
+            scales[t] = column.sum()
+            table[t] = column / scales[t] if scales[t] else column
+
+        return table, scales
+
+    def scaled_backward(self, observed, scales, emissions = None):
+        '''Backward algorithm scaled by the normalizers from scaled_forward'''
+        if emissions is None:
+            emissions = self.emissions(observed)
+        table = np.empty_like(emissions)
+        inverse = np.divide(1, scales, out = np.zeros_like(scales),
+                where = scales != 0)
+
+        table[-1] = inverse[-1]
+        for t in range(len(observed) - 2, -1, -1):
+            table[t] = self.pullback(emissions[t + 1] * table[t + 1]) * inverse[t]
+
+        return table
+
+    def log_probability_of_observed(self, observed, scales = None):
+        if scales is None:
+            _, scales = self.scaled_forward(observed)
+        with np.errstate(divide = 'ignore'):
+            return np.log(scales).sum().item()
+
+    def log_probabilities_of_observed(self, sequences, bucket_width = 16):
+        '''Log probability of every sequence, scored in vectorized batches.
+        Sequences are grouped into buckets of similar length; within a
+        bucket the shorter sequences are masked once they run out.
+
+        sequences -- list of observation sequences
+        bucket_width -- largest length difference within one bucket
+        '''
+        output = np.empty(len(sequences))
+        for indices in length_buckets(sequences, bucket_width):
+            output[indices] = self.batch_log_probability(
+                    [sequences[i] for i in indices])
+        return output
+
+    def batch_log_probability(self, sequences):
+        '''Scaled forward recursion over a (batch, states) table'''
+        lengths = np.array([len(s) for s in sequences])
+        codes = np.full((len(sequences), lengths.max(initial = 0)), -1, dtype = np.intp)
+        for i, observed in enumerate(sequences):
+            codes[i, :lengths[i]] = self.encode(observed)
+
+        # the trailing row of zeros is the emission rate of unknown symbols
+        emission_rows = np.vstack((self.b.T, np.zeros(len(self.labels))))
+        log_prob = np.zeros(len(sequences))
+
+        for t in range(codes.shape[1]):
+            rates = emission_rows[codes[:, t]]
+            column = self.pi * rates if t == 0 else self.propagate(column) * rates
+            scales = column.sum(axis = 1)
+            active = t < lengths
+            with np.errstate(divide = 'ignore'):
+                log_prob[active] += np.log(scales[active])
+            np.divide(column, scales[:, None], out = column,
+                    where = scales[:, None] != 0)
+
+        return log_prob
+
+    def probability_of_observed(self, observed, forward_table = None):
+        if forward_table is None:
+            forward_table = self.forward(observed)
+        return forward_table[-1].sum()
+
+    def reestimate(self, observed, metrics = None):
+        '''Baum-Welch re-estimation of a single sequence, as arrays.
+        Returns (pi_bar, a_bar, b_bar) where a_bar is indexed by edge.
+
+        metrics -- optional Metrics to time the phases and count the sequence in
+        '''
+        codes = self.encode(observed)
+        with phase(metrics, 'forward'):
+            emissions = self.emissions(observed)
+            forward_table, scales = self.scaled_forward(observed, emissions)
+        with phase(metrics, 'backward'):
+            backward_table = self.scaled_backward(observed, scales, emissions)
+
+        with phase(metrics, 'expected_counts'):
+            # expected transitions, summed over time; the scaled tables
+            # already fold the observation probability in
+            rows, cols = self.edges
+            xi = self.expected_transitions(forward_table[:-1],
+                    emissions[1:] * backward_table[1:])
+
+            # expected state occupancy at each time
+            gamma = forward_table * backward_table * scales[:, None]
+            transitions_out = gamma[:-1].sum(axis = 0)[rows]
+
+            counts = np.zeros((len(self.symbols), len(observed)))
+            known = codes >= 0
+            counts[codes[known], np.nonzero(known)[0]] = 1
+            numerator = (counts @ gamma).T
+            denominator = gamma.sum(axis = 0)[:, None]
+
+        with phase(metrics, 'm_step'):
+            pi_bar = gamma[0]
+            a_bar = np.divide(xi, transitions_out,
+                    out = np.zeros_like(xi), where = xi != 0)
+            b_bar = np.divide(numerator, denominator,
+                    out = np.zeros_like(numerator), where = denominator != 0)
+
+        if metrics is not None:
+            metrics.add('sequences', 1)
+            metrics.add('symbols', len(observed))
+            metrics.add('log_likelihood', self.log_probability_of_observed(observed, scales))
+        return pi_bar, a_bar, b_bar
+
+    def baum_welsch(self, observed):
+        pi, a, b = self.reestimate(observed)
+        return self.to_dicts(pi, a, b)
+
+    def to_dicts(self, pi, a, b):
+        '''Convert array parameters to the dicts HiddenMarkovModel takes'''
+        labels = self.labels
+        rows, cols = self.edges
+
+        pi_bar = dict(zip(labels, pi.tolist()))
+        a_bar = {(labels[i], labels[j]): p
+                for i, j, p in zip(rows.tolist(), cols.tolist(), a.tolist())}
+        b_bar = {}
+        for i, label in enumerate(labels):
+            for k, symbol in enumerate(self.symbols):
+                b_bar[(label, symbol)] = b[i, k].item()
+        return pi_bar, a_bar, b_bar
+
+    def to_model(self):
+        return HiddenMarkovModel(*self.to_dicts(
+                self.pi, self.transition_rates(), self.b))
+
+    def viterbi(self, observations):
+        '''Do the viterbi algorithm
+        Computes the most likely sequence and its probability
+
+        observations -- list of observed outputs
+        '''
+        emissions = self.emissions(observations)
+        probability = self.pi * emissions[0]
+        return self.decode(probability, emissions, False)
+
+    def log_viterbi(self, observations):
+        '''Do the viterbi algorithm in log space
+        Computes the most likely sequence and its log probability
+
+        observations -- list of observed outputs
+        '''
+        with np.errstate(divide = 'ignore'):
+            log_emissions = np.log(self.emissions(observations))
+            probability = np.log(self.pi) + log_emissions[0]
+        return self.decode(probability, log_emissions, True)
+
+    def viterbi_all(self, sequences, bucket_width = 16):
+        '''Decode many sequences at once in log space.
+        Returns a (path, log probability) pair per sequence, in input order.
+
+        sequences -- list of observation sequences
+        bucket_width -- largest length difference within one batch
+        '''
+        output = [None] * len(sequences)
+        for indices in length_buckets(sequences, bucket_width):
+            decoded = self.batch_viterbi([sequences[i] for i in indices])
+            for i, result in zip(indices, decoded):
+                output[i] = result
+        return output
+
+    def batch_viterbi(self, sequences):
+        '''Log-space Viterbi over a (batch, states) table, with backpointers
+        kept in the smallest integer type that can index the states'''
+        lengths = np.array([len(s) for s in sequences])
+        length = lengths.max(initial = 0)
+        if not length:
+            return [([], 0.0) for s in sequences]
+
+        codes = np.full((len(sequences), length), -1, dtype = np.intp)
+        for i, observed in enumerate(sequences):
+            codes[i, :lengths[i]] = self.encode(observed)
+
+        # the trailing row of -inf is the emission rate of unknown symbols
+        states = len(self.labels)
+        with np.errstate(divide = 'ignore'):
+            log_rows = np.log(np.vstack((self.b.T, np.zeros(states))))
+            scores = np.log(self.pi) + log_rows[codes[:, 0]]
+
+        backtrace = np.zeros((length, len(sequences), states),
+                dtype = np.min_scalar_type(max(states - 1, 0)))
+        for t in range(1, length):
+            best, backtrace[t] = self.best_predecessors(scores, True)
+            active = (t < lengths)[:, None]
+            scores = np.where(active, best + log_rows[codes[:, t]], scores)
+
+        # walk every sequence back from its own last time step
+        batch = np.arange(len(sequences))
+        ends = lengths - 1
+        last = scores.argmax(axis = 1)
+        paths = np.zeros((len(sequences), length), dtype = np.intp)
+        current = last
+        for t in range(length - 1, -1, -1):
+            current = np.where(ends == t, last, current)
+            paths[:, t] = current
+            if t:
+                current = np.where(t <= ends, backtrace[t, batch, current], current)
+
+        log_probs = scores[batch, last]
+        return [([self.labels[j] for j in paths[i, :lengths[i]]],
+                log_probs[i].item() if lengths[i] else 0.0) for i in batch]
+
+    def decode(self, probability, emissions, log_space):
+        '''Viterbi recursion shared by viterbi and log_viterbi'''
+        length = len(emissions)
+        backtrace = np.zeros((length, len(self.labels)), dtype = np.intp)
+
+        for t in range(1, length):
+            best, backtrace[t] = self.best_predecessors(probability, log_space)
+            if log_space:
+                probability = best + emissions[t]
+            else:
+                probability = best * emissions[t]
+
+        current = probability.argmax()
+        max_prob = probability[current]
+
+        backwards = []
+        for t in range(length - 1, -1, -1):
+            backwards.append(self.labels[current])
+            current = backtrace[t][current]
+
+        return backwards[::-1], max_prob.item()
+
+class DenseModel(CompiledModel):
+    '''Compiled model that stores transitions as a full matrix
+
+    a -- transition probabilities, shape (states, states)
+    edges -- declared transitions; defaults to the nonzero entries of a
+    '''
+
+    def __init__(self, labels, symbols, pi, a, b, edges = None):
+        a = np.asarray(a, dtype = float)
+        if edges is None:
+            edges = np.nonzero(a)
+        CompiledModel.__init__(self, labels, symbols, pi, b, edges)
+        self.a = a
+        self.log_a = None
+
+    def with_parameters(self, pi, rates, b):
+        '''A DenseModel with the same states and edges but new probabilities'''
+        a = np.zeros_like(self.a)
+        a[self.edges] = rates
+        return DenseModel(self.labels, self.symbols, pi, a, b, self.edges)
+
+    def propagate(self, vector):
+        '''Push a (batch of) state distribution(s) one step forward'''
+        return vector @ self.a
+
+    def pullback(self, vector):
+        '''Pull a (batch of) state vector(s) one step backward'''
+        return vector @ self.a.T
+
+    def transition_rates(self):
+        '''Probability of each declared transition, in edge order'''
+        return self.a[self.edges]
+
+    def expected_transitions(self, forward_table, weighted):
+        '''Sum over time of forward[t, from] * a[from, to] * weighted[t, to]
+        for every edge
+        '''
+        return (forward_table.T @ weighted)[self.edges] * self.transition_rates()
+
+    def best_predecessors(self, scores, log_space = False):
+        '''For every state, the best score reachable from a predecessor
+        and the index of that predecessor.
+
+        scores -- current scores, shape (states,) or (batch, states)
+        log_space -- add log transition rates instead of multiplying
+        '''
+        if log_space:
+            if self.log_a is None:
+                with np.errstate(divide = 'ignore'):
+                    self.log_a = np.log(self.a)
+            candidates = scores[..., :, None] + self.log_a
+        else:
+            candidates = scores[..., :, None] * self.a
+        return candidates.max(axis = -2), candidates.argmax(axis = -2)
+
+def length_buckets(sequences, width):
+    '''Group sequence indices so lengths within a group differ by less than width'''
+    order = sorted(range(len(sequences)), key = lambda i: len(sequences[i]))
+    buckets = []
+    for i in order:
+        if buckets and len(sequences[i]) - len(sequences[buckets[-1][0]]) < width:
+            buckets[-1].append(i)
+        else:
+            buckets.append([i])
+    return buckets
+
+def sorted_symbols(symbols):
+    '''Symbols in a fixed order, so arrays line up across processes;
+    sets of strings iterate in a different order under each hash seed'''
+    try:
+        return sorted(symbols)
+    except TypeError:
+        return sorted(symbols, key = lambda s: (type(s).__name__, repr(s)))
+
+def model_arrays(model):
+    '''Read a HiddenMarkovModel's parameters into arrays.
+    Returns (labels, symbols, pi, edges, rates, b) where rates holds the
+    probability of each edge.
+    '''
+    labels = list(model.state_map)
+    index = {label: i for i, label in enumerate(labels)}
+    symbols = sorted_symbols(model.possible_observations)
+    symbol_index = {s: i for i, s in enumerate(symbols)}
+
+    states = len(labels)
+    pi = np.zeros(states)
+    b = np.zeros((states, len(symbols)))
+    rows = []
+    cols = []
+    rates = []
+
+    for state, probability in model.initial_states:
+        pi[index[state.element]] = probability
+
+    for i, label in enumerate(labels):
+        state = model.state_map[label]
+        seen = set()
+        for to_state, probability in state.transitions:
+            j = index[to_state.element]
+            if j not in seen:
+                seen.add(j)
+                rows.append(i)
+                cols.append(j)
+                rates.append(probability)
+        for symbol, probability in state.emissions:
+            b[i, symbol_index[symbol]] = probability
+
+    edges = (np.array(rows, dtype = np.intp), np.array(cols, dtype = np.intp))
+    return labels, symbols, pi, edges, np.array(rates, dtype = float), b
+
+def compile_model(model):
+    '''Compile a HiddenMarkovModel into a DenseModel'''
+    labels, symbols, pi, edges, rates, b = model_arrays(model)
+    a = np.zeros((len(labels), len(labels)))
+    a[edges] = rates
+    return DenseModel(labels, symbols, pi, a, b, edges)
@@ -1,10 +1,17 @@
+import heapq
+import math
 import random
+from array import array
 
 class HiddenMarkovModel:
     '''Hidden Markov Model'''
 
-    def __init__(self, pi = None, a = None, b = None):
-        self.initial_states = ProbabilityPair()
+    def __init__(self, pi = None, a = None, b = None, typecode = 'd'):
+        '''pi, a, b -- optional dicts of initial, transition and emission probabilities
+        typecode -- 'd' to store probabilities as float64, 'f' as float32
+        '''
+        self.typecode = typecode
+        self.initial_states = ProbabilityPair(typecode)
         self.state_map = {}
         self.possible_observations = set()
         self.current_state = None
@@ -19,6 +26,32 @@ class HiddenMarkovModel:
             for (state, obs), prob in b.items():
                 self.add_emission(state, obs, prob)
 
+    def __getstate__(self):
+        '''Pickle by label rather than by State; chains of State references
+        are deep enough to exhaust the recursion limit on large models'''
+        return {
+            'typecode': self.typecode,
+            'states': list(self.state_map),
+            'initial_states': [(state.element, p) for state, p in self.initial_states],
+            'transitions': [(label, [(to_state.element, p) for to_state, p in state.transitions])
+                    for label, state in self.state_map.items()],
+            'emissions': [(label, list(state.emissions))
+                    for label, state in self.state_map.items()],
+        }
+
+    def __setstate__(self, data):
+        self.__init__(typecode = data.get('typecode', 'd'))
+        for label in data['states']:
+            self.get_state(label)
+        for label, probability in data['initial_states']:
+            self.add_initial_state(label, probability)
+        for label, transitions in data['transitions']:
+            for to_label, probability in transitions:
+                self.add_transition(label, to_label, probability)
+        for label, emissions in data['emissions']:
+            for emission, probability in emissions:
+                self.add_emission(label, emission, probability)
+
     def add_initial_state(self, element, probability):
         state = self.get_state(element)
         self.initial_states.add(state, probability)
@@ -35,10 +68,16 @@ class HiddenMarkovModel:
         if element in self.state_map:
             return self.state_map[element]
         else:
-            state = State(element)
+            state = State(element, self.typecode)
             self.state_map[element] = state
             return state
 
+    def with_typecode(self, typecode):
+        '''A copy of the model storing its probabilities with another typecode'''
+        model = HiddenMarkovModel.__new__(HiddenMarkovModel)
+        model.__setstate__(dict(self.__getstate__(), typecode = typecode))
+        return model
+
     def normalize(self):
         for state in self.state_map.values():
             state.emissions.normalize()
@@ -129,6 +168,58 @@ class HiddenMarkovModel:
 
         return table
 
+    def scaled_forward(self, observed):
+        '''Forward algorithm with every time step normalized to sum to 1,
+        so long sequences don't underflow.
+        Returns the table and the normalizer used at each time step.
+        '''
+        table = [{} for o in observed]
+        scales = []
+
+        for label, state in self.state_map.items():
+            initial_rate = self.initial_states.probability(state)
+            table[0][label] = initial_rate * state.emit_rate(observed[0])
+        scales.append(normalize_column(table[0]))
+
+        for t in range(0, len(observed) - 1):
+            next_steps = {label: 0 for label in self.state_map}
+
+            for label, state in self.state_map.items():
+                for (to_state, prob) in state.transitions:
+                    next_steps[to_state.element] += prob * table[t][label]
+
+            for label, total in next_steps.items():
+                rate = self.state_map[label].emit_rate(observed[t + 1])
+                table[t + 1][label] = rate * total
+            scales.append(normalize_column(table[t + 1]))
+
+        return table, scales
+
+    def scaled_backward(self, observed, scales):
+        '''Backward algorithm scaled by the normalizers from scaled_forward'''
+        length = len(observed)
+        table = [{} for o in observed]
+
+        for s in self.state_map:
+            table[length - 1][s] = inverse(scales[length - 1])
+
+        for t in range(length - 2, -1, -1):
+            scale = inverse(scales[t])
+            for from_label, from_state in self.state_map.items():
+                summation = 0
+                for (to_state, prob) in from_state.transitions:
+                    summation += (prob
+                            * to_state.emit_rate(observed[t + 1])
+                            * table[t + 1][to_state.element])
+                table[t][from_label] = summation * scale
+
+        return table
+
+    def log_probability_of_observed(self, observed, scales = None):
+        if scales is None:
+            _, scales = self.scaled_forward(observed)
+        return sum(log(c) for c in scales)
+
     def probability_of_observed(self, observed, forward_table = None):
         if not forward_table:
             forward_table = self.forward(observed)
@@ -147,99 +238,81 @@ class HiddenMarkovModel:
             prob += self.probability_of_transition_at_time(label, to_label, t, forward_table, backward_table, observation_probability, observed)
         return prob
 
+    def expected_counts(self, observed, forward_table, backward_table):
+        '''Accumulate the Baum-Welch sufficient statistics in one pass
+        over the (scaled) forward and backward tables.
+
+        Returns (initial, transitions, transitions_out, emissions, occupancy):
+        initial -- expected occupancy of each state at the first time
+        transitions -- expected count of each (from, to) transition
+        transitions_out -- expected occupancy of each state, excluding the last time
+        emissions -- expected count of each (state, observation) emission
+        occupancy -- expected occupancy of each state over all times
+        '''
+        length = len(observed)
+        targets = {label: [(to_state.element, prob) for to_state, prob in state.transitions]
+                for label, state in self.state_map.items()}
+
+        initial = {label: 0 for label in self.state_map}
+        transitions = {(label, to_label): 0
+                for label in targets for to_label, _ in targets[label]}
+        transitions_out = {label: 0 for label in self.state_map}
+        emissions = {(label, emission): 0
+                for label in self.state_map for emission in self.possible_observations}
+
+        for t in range(length - 1):
+            next_obs = observed[t + 1]
+            reach = {label: state.emit_rate(next_obs) * backward_table[t + 1][label]
+                    for label, state in self.state_map.items()}
+            obs = observed[t]
+
+            for label, forward_rate in forward_table[t].items():
+                if not forward_rate:
+                    continue
+                total = 0
+                for to_label, prob in targets[label]:
+                    xi = forward_rate * prob * reach[to_label]
+                    transitions[(label, to_label)] += xi
+                    total += xi
+
+                if t == 0:
+                    initial[label] = total
+                transitions_out[label] += total
+                emissions[(label, obs)] += total
+
+        occupancy = dict(transitions_out)
+        obs = observed[-1]
+        for label, gamma in forward_table[-1].items():
+            if length == 1:
+                initial[label] = gamma
+            occupancy[label] += gamma
+            emissions[(label, obs)] += gamma
+
+        return initial, transitions, transitions_out, emissions, occupancy
+
     def baum_welsch(self, observed):
-        forward_table = self.forward(observed)
-        backward_table = self.backward(observed)
-        observation_probability = self.probability_of_observed(observed, forward_table)
-
-        #def probability_of_transition_at_time(from_label, to_label, t):
-        #    return (forward_table[t][from_label]
-        #            * self.transition_probability(from_label, to_label)
-        #            * self.state_map[to_label].emit_rate(observed[t + 1])
-        #            * backward_table[t + 1][to_label]
-        #            / observation_probability)
-
-        #def probability_of_state_at_time(label, t):
-        #    prob = 0
-        #    for to_label in self.state_map:
-        #        prob += probability_of_transition_at_time(label, to_label, t, forward_table, backward_table, observation_probability, observed)
-        #    return prob
-
-        transition_table = {}
-        for from_state in self.state_map:
-            for (state, _) in self.state_map[from_state].transitions:
-                to_state = state.element
-
-                key = (from_state, to_state)
-                transition_table[key] = []
-                for t in range(len(observed) - 1):
-                    transition_table[key].append(self.probability_of_transition_at_time(
-                            from_state, to_state, t, forward_table, backward_table, observation_probability, observed))
-
-        transition_out_table = {}
-        expected_transitions = {}
-        for state in self.state_map:
-            transition_out_table[state] = [0 for obs in observed]
-            total_prob = 0
-            for t in range(len(observed) - 1):
-                prob = self.probability_of_state_at_time(state, t, forward_table, backward_table, observation_probability, observed)
-                total_prob += prob
-                transition_out_table[state][t] = prob
-
-            expected_transitions[state] = prob
-            transition_out_table[state][-1] = forward_table[-1][state] / observation_probability
-
-
-        expected_transitions = {k: sum(v) for k, v in transition_table.items()}
-        expected_transitions_out = {k: sum(v[:-1]) for k, v in transition_out_table.items()}
-
-        pi_bar = {}
-        for state in self.state_map:
-            pi_bar[state] = transition_out_table[state][0]
+        # scaled tables already fold the observation probability in
+        forward_table, scales = self.scaled_forward(observed)
+        backward_table = self.scaled_backward(observed, scales)
+        return self.reestimate(*self.expected_counts(
+                observed, forward_table, backward_table))
 
+    def reestimate(self, initial, transitions, transitions_out, emissions, occupancy):
+        '''Turn expected counts into re-estimated pi_bar, a_bar and b_bar'''
+        pi_bar = dict(initial)
 
         a_bar = {}
-        for from_state, state in self.state_map.items():
-            for to_state2, prob in state.transitions:
-                to_state = to_state2.element
-                key = (from_state, to_state)
-
-                if expected_transitions[key]:
-                    a_bar[key] = expected_transitions[key] / expected_transitions_out[from_state]
-                else:
-                    a_bar[key] = 0
+        for (from_label, to_label), expected in transitions.items():
+            if expected:
+                a_bar[(from_label, to_label)] = expected / transitions_out[from_label]
+            else:
+                a_bar[(from_label, to_label)] = 0
 
         b_bar = {}
-        for state in self.state_map:
-            for emission in self.possible_observations:
-                label = (state, emission)
-                numerator = 0
-                denominator = 0
-                # TODO: Fix this line
-                for t in range(len(observed)):
-                    obs = observed[t]
-                    denominator += transition_out_table[state][t]
-                    if emission == obs:
-                        numerator += transition_out_table[state][t]
-                b_bar[label] = numerator / denominator
-
-        if True:
-            return pi_bar, a_bar, b_bar
-
-        model = HiddenMarkovModel()
-        for label, probability in pi_bar.items():
-            model.add_initial_state(label, probability)
-
-        for (from_label, to_label), prob in a_bar.items():
-            model.add_transition(from_label, to_label, prob)
-
-        for (state, obs), prob in b_bar.items():
-            model.add_emission(state, obs, prob)
-
-        #ßmodel.normalize()
-
-        return model
+        for (label, emission), expected in emissions.items():
+            b_bar[(label, emission)] = expected / occupancy[label]
 
+        return pi_bar, a_bar, b_bar
 
     def viterbi(self, observations):
         '''Do the viterbi algorithm
@@ -297,15 +370,169 @@ class HiddenMarkovModel:
         # return the reversed backtrace and its probability
         return backwards[::-1], max_prob
 
+    def log_viterbi(self, observations):
+        '''Do the viterbi algorithm in log space
+        Computes the most likely sequence and its log probability,
+        without underflowing on long sequences.
+
+        observations -- list of observed outputs
+        '''
+
+        length = len(observations)
+
+        backtrace = [{} for i in range(length)]
+        probability = [{} for i in range(length)]
+
+        # base case
+        for label, state in self.state_map.items():
+            probability[0][label] = (log(self.initial_states.probability(state))
+                    + log(state.emit_rate(observations[0])))
+            backtrace[0][label] = None
+
+        # recursive step, only following transitions that exist
+        for t in range(1, length):
+            best = {label: -math.inf for label in self.state_map}
+            best_label = {label: None for label in self.state_map}
+
+            for from_label, from_state in self.state_map.items():
+                from_prob = probability[t - 1][from_label]
+                for (to_state, prob) in from_state.transitions:
+                    to_label = to_state.element
+                    candidate = from_prob + log(prob)
+                    if candidate > best[to_label]:
+                        best[to_label] = candidate
+                        best_label[to_label] = from_label
+
+            for label, state in self.state_map.items():
+                probability[t][label] = (best[label]
+                        + log(state.emit_rate(observations[t])))
+                backtrace[t][label] = best_label[label]
+
+        # figure out max probability and the last label
+        max_prob = -math.inf
+        max_label = None
+        for label, p in probability[length - 1].items():
+            if p > max_prob:
+                max_prob = p
+                max_label = label
+
+        # backtrack through labels
+        backwards = []
+        current = max_label
+        for t in range(length - 1, -1, -1):
+            backwards.append(current)
+            current = backtrace[t][current]
+
+        return backwards[::-1], max_prob
+
+    def beam_viterbi(self, observations, margin = None, width = None):
+        '''Do the viterbi algorithm in log space, following only the states
+        that survive pruning at each step
+
+        observations -- list of observed outputs
+        margin -- drop states whose score is more than this below the best
+        width -- keep at most this many states
+        Returns the sequence, its log probability and a bound: every path
+        through a pruned state has log probability at most the bound, so
+        the result is exact whenever the bound is below its log probability.
+        '''
+        bound = -math.inf
+        backtrace = []
+
+        scores = {}
+        for label, state in self.state_map.items():
+            score = (log(self.initial_states.probability(state))
+                    + log(state.emit_rate(observations[0])))
+            if score > -math.inf:
+                scores[label] = score
+        backtrace.append({label: None for label in scores})
+
+        for t in range(1, len(observations)):
+            scores, pruned = prune_beam(scores, margin, width, True)
+            bound = max(bound, pruned)
+
+            best = {}
+            best_label = {}
+            for from_label, from_score in scores.items():
+                for (to_state, prob) in self.state_map[from_label].transitions:
+                    to_label = to_state.element
+                    candidate = from_score + log(prob)
+                    if candidate > best.get(to_label, -math.inf):
+                        best[to_label] = candidate
+                        best_label[to_label] = from_label
+
+            scores = {}
+            for label, score in best.items():
+                score += log(self.state_map[label].emit_rate(observations[t]))
+                if score > -math.inf:
+                    scores[label] = score
+            backtrace.append({label: best_label[label] for label in scores})
+
+        if not scores:
+            return [], -math.inf, bound
+
+        current = max(scores, key = scores.get)
+        max_prob = scores[current]
+
+        backwards = []
+        for t in range(len(observations) - 1, -1, -1):
+            backwards.append(current)
+            current = backtrace[t][current]
+
+        return backwards[::-1], max_prob, bound
+
+    def beam_forward(self, observed, margin = None, width = None):
+        '''Scaled forward algorithm following only the states that survive
+        pruning at each step
+
+        margin -- drop states whose log probability is more than this below the best
+        width -- keep at most this many states
+        Returns the log probability of the observations, which can only
+        be an underestimate, and the log of an upper bound on the true
+        probability (the beam probability plus all the pruned forward mass).
+        '''
+        column = {}
+        for label, state in self.state_map.items():
+            rate = self.initial_states.probability(state) * state.emit_rate(observed[0])
+            if rate:
+                column[label] = rate
+        total = normalize_column(column)
+        log_prob = log(total)
+        pruned_mass = []
+
+        for t in range(1, len(observed)):
+            column, pruned = prune_beam(column, margin, width, False)
+            if pruned:
+                pruned_mass.append(log_prob + math.log(pruned))
+
+            next_steps = {}
+            for label, rate in column.items():
+                for (to_state, prob) in self.state_map[label].transitions:
+                    to_label = to_state.element
+                    next_steps[to_label] = next_steps.get(to_label, 0) + prob * rate
+
+            column = {}
+            for label, total in next_steps.items():
+                rate = self.state_map[label].emit_rate(observed[t]) * total
+                if rate:
+                    column[label] = rate
+            log_prob += log(normalize_column(column))
+
+        bound = log_prob
+        for mass in pruned_mass:
+            bound = max(bound, mass) + math.log1p(math.exp(-abs(bound - mass)))
+        return log_prob, bound
+
 
 
 
 class State:
+    __slots__ = ('element', 'transitions', 'emissions')
 
-    def __init__(self, element):
+    def __init__(self, element, typecode = 'd'):
         self.element = element
-        self.transitions = ProbabilityPair()
-        self.emissions = ProbabilityPair()
+        self.transitions = ProbabilityPair(typecode)
+        self.emissions = ProbabilityPair(typecode)
 
     def __repr__(self):
         return 'State({})'.format(self.element)
@@ -337,12 +564,49 @@ class State:
     def emit_rate(self, emission):
         return self.emissions.probability(emission)
 
+def log(p):
+    return math.log(p) if p > 0 else -math.inf
+
+def inverse(p):
+    return 1 / p if p else 0
+
+def normalize_column(column):
+    '''Scale a table column in place to sum to 1 and return the old total'''
+    total = sum(column.values())
+    if total:
+        for label in column:
+            column[label] /= total
+    return total
+
+def prune_beam(scores, margin, width, log_space):
+    '''Keep the width best scores within margin (in log probability) of the best.
+    Returns the kept scores and the best pruned log score in log space,
+    or the pruned total otherwise.
+    '''
+    if not scores:
+        return scores, -math.inf if log_space else 0
+
+    kept = scores
+    if width is not None and width < len(scores):
+        kept = dict(heapq.nlargest(width, scores.items(), key = lambda item: item[1]))
+    if margin is not None:
+        best = max(kept.values())
+        cutoff = best - margin if log_space else best * math.exp(-margin)
+        kept = {label: score for label, score in kept.items() if score >= cutoff}
+
+    dropped = [score for label, score in scores.items() if label not in kept]
+    if log_space:
+        return kept, max(dropped, default = -math.inf)
+    return kept, sum(dropped)
+
 def update_probabilities(probability_pair, probs):
     probability_pair.clear()
     for label, probability in probs.items():
         probability_pair.add(label, probability)
 
 class ProbIterator:
+    __slots__ = ('prob_pair', 'current')
+
     def __init__(self, prob_pair):
         self.prob_pair = prob_pair
         self.current = 0
@@ -358,24 +622,40 @@ class ProbIterator:
             return (element, prob_pair.probability(element))
 
 class ProbabilityPair:
+    '''Elements with their probabilities, kept in insertion order.
+    Probabilities live in a flat array rather than a list of floats.
+
+    typecode -- 'd' stores float64, 'f' float32 to halve the storage
+    '''
+    __slots__ = ('elements', 'rates', 'total', 'indices', 'alias')
 
-    def __init__(self):
+    def __init__(self, typecode = 'd'):
         self.elements = []
-        self.probabilities = []
+        self.rates = array(typecode)
+        self.total = 0
+        # element -> index of its first occurrence
+        self.indices = {}
+        # (cutoffs, aliases) for sampling, built on first use
+        self.alias = None
 
     def __repr__(self):
-        return str(['{}({})'.format(e, p) for e, p in zip(self.elements, self.probabilities)])
+        return str(['{}({})'.format(e, p) for e, p in zip(self.elements, self.rates)])
 
     def __iter__(self):
         return ProbIterator(self)
 
     def clear(self):
-        self.__init__()
+        self.__init__(self.rates.typecode)
 
     def add(self, element, probability):
-        probability += self.get_total_probability()
+        previous = self.total
+        self.total = probability + previous
+        if element not in self.indices:
+            self.indices[element] = len(self.elements)
         self.elements.append(element)
-        self.probabilities.append(probability)
+        # what total grew by after rounding, matching the old cumulative list exactly
+        self.rates.append(self.total - previous)
+        self.alias = None
 
     def size(self):
         return len(self.elements)
@@ -384,36 +664,57 @@ class ProbabilityPair:
         return self.size() == 0
 
     def get_total_probability(self):
-        if self.is_empty():
-            return 0
-        else:
-            return self.probabilities[-1]
+        return self.total
 
     def probability(self, element):
-        p = self.probabilities
-        for i in range(len(self.elements)):
-            if self.elements[i] == element:
-                return p[0] if i == 0 else p[i] - p[i - 1]
-        return 0
+        i = self.indices.get(element)
+        return 0 if i is None else self.rates[i]
 
     def get_random(self):
-        if not self.is_empty():
-            elements = self.elements
-            probabilities = self.probabilities
-
-            r = random.random() * self.get_total_probability()
-            begin = 0
-            end = self.size()
-
-            while begin < end:
-                mid = (begin + end) // 2
-                if r > probabilities[mid]:
-                    begin = mid + 1
-                elif r < probabilities[mid] and mid == 0 or r > probabilities[mid - 1]:
-                    return elements[mid]
-                else:
-                    end = mid
+        '''Draw an element in O(1) using Walker's alias method'''
+        if self.alias is None:
+            self.alias = self.build_alias()
+        if not self.alias:
+            return None
+
+        cutoffs, aliases = self.alias
+        r = random.random() * len(cutoffs)
+        i = int(r)
+        if r - i < cutoffs[i]:
+            return self.elements[i]
+        else:
+            return self.elements[aliases[i]]
 
-    def normalize(self):
+    def build_alias(self):
+        '''Build Vose's alias table; empty if there is nothing to draw'''
         total = self.get_total_probability()
-        self.probabilities = [p / total for p in self.probabilities]
+        if not total:
+            return ()
+
+        count = len(self.rates)
+        weights = [p * count / total for p in self.rates]
+        cutoffs = [1.0] * count
+        aliases = list(range(count))
+
+        small = [i for i, w in enumerate(weights) if w < 1]
+        large = [i for i, w in enumerate(weights) if w >= 1]
+        while small and large:
+            less = small.pop()
+            more = large.pop()
+            cutoffs[less] = weights[less]
+            aliases[less] = more
+            weights[more] += weights[less] - 1
+            if weights[more] < 1:
+                small.append(more)
+            else:
+                large.append(more)
+
+        # anything left over is only off from 1 by rounding
+        return cutoffs, aliases
+
+    def normalize(self):
+        total = self.total
+        if self.elements:
+            self.rates = array(self.rates.typecode, [p / total for p in self.rates])
+            self.total = 1.0
+        self.alias = None
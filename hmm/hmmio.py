@@ -1,7 +1,9 @@
 #! /usr/bin/env python3
 
 import json
+import numpy as np
 from hmm.hmm import HiddenMarkovModel
+from hmm.bank import ModelBank, make_bank
 
 def prob_pair_to_dict(prob_pair, to_element = lambda x: x):
     return [(to_element(state), prob) for state, prob in prob_pair]
@@ -46,3 +48,106 @@ def save(models, filename):
 def load(filename):
     data = json.load(open(filename))
     return {int(label): dict_to_hmm(model) for label, model in data.items()}
+
+# binary bank format: magic, header length, JSON header, then the stacked
+# pi, a and b arrays of a ModelBank as raw little-endian float64.
+# Names, symbols and labels in the header are tagged with their type.
+magic = b'HMMBANK1'
+alignment = 64
+array_names = ('pi', 'a', 'b')
+
+def encode_value(value):
+    '''A JSON-safe, type-tagged form of a label, name or symbol.
+    Supports bool, int, float, str and tuples of them; numpy scalars
+    become the matching Python type.
+    '''
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, bool):
+        return ['bool', value]
+    if isinstance(value, int):
+        return ['int', value]
+    if isinstance(value, float):
+        return ['float', value]
+    if isinstance(value, str):
+        return ['str', value]
+    if isinstance(value, tuple):
+        return ['tuple', [encode_value(v) for v in value]]
+    raise TypeError('cannot store {!r} of type {} in a model bank; use bool, int, '
+            'float, str or tuples of them'.format(value, type(value).__name__))
+
+def decode_value(data):
+    kind, value = data
+    if kind == 'tuple':
+        return tuple(decode_value(v) for v in value)
+    return {'bool': bool, 'int': int, 'float': float, 'str': str}[kind](value)
+
+def save_bank(models, filename):
+    '''Write models in the binary bank format
+
+    models -- a ModelBank, or (label, model) pairs as for save
+    '''
+    bank = models if isinstance(models, ModelBank) else make_bank(dict(models))
+
+    arrays = [np.ascontiguousarray(getattr(bank, name), dtype = '<f8')
+            for name in array_names]
+    header = {
+        'names': [encode_value(name) for name in bank.names],
+        'symbols': [encode_value(symbol) for symbol in bank.symbols],
+        'labels': [[encode_value(label) for label in labels] for labels in bank.labels],
+        'arrays': [],
+    }
+
+    offset = 0
+    for name, array in zip(array_names, arrays):
+        header['arrays'].append({'name': name, 'shape': array.shape, 'offset': offset})
+        offset += padded(array.nbytes)
+    encoded = json.dumps(header).encode('utf-8')
+
+    with open(filename, 'wb') as f:
+        f.write(magic)
+        f.write(len(encoded).to_bytes(8, byteorder = 'little'))
+        f.write(encoded)
+        f.write(bytes(padded(f.tell()) - f.tell()))
+        for array in arrays:
+            f.write(array.tobytes())
+            f.write(bytes(padded(array.nbytes) - array.nbytes))
+
+def load_bank(filename, mmap = True):
+    '''Read a ModelBank written by save_bank
+
+    mmap -- map the arrays from the file instead of reading them into memory
+    '''
+    with open(filename, 'rb') as f:
+        if f.read(len(magic)) != magic:
+            raise ValueError('{} is not a model bank file'.format(filename))
+        length = int.from_bytes(f.read(8), byteorder = 'little')
+        header = json.loads(f.read(length).decode('utf-8'))
+        start = padded(f.tell())
+
+    names = [decode_value(name) for name in header['names']]
+    symbols = [decode_value(symbol) for symbol in header['symbols']]
+    labels = [[decode_value(label) for label in labels] for labels in header['labels']]
+
+    if mmap:
+        data = np.memmap(filename, dtype = np.uint8, mode = 'r')
+    else:
+        data = np.fromfile(filename, dtype = np.uint8)
+
+    arrays = {}
+    for entry in header['arrays']:
+        shape = tuple(entry['shape'])
+        begin = start + entry['offset']
+        count = int(np.prod(shape))
+        arrays[entry['name']] = (data[begin:begin + 8 * count]
+                .view('<f8').reshape(shape))
+
+    return ModelBank(names, symbols, arrays['pi'], arrays['a'], arrays['b'], labels)
+
+def load_models(filename, mmap = True):
+    '''Read the models of a bank file as a dict of label -> DenseModel'''
+    bank = load_bank(filename, mmap)
+    return {name: bank.model(name) for name in bank.names}
+
+def padded(size):
+    return -(-size // alignment) * alignment
@@ -0,0 +1,103 @@
+#! /usr/bin/env python3
+
+import contextlib
+import json
+import time
+
+# phases of a training epoch, in the order they run
+phases = ('compile', 'forward', 'backward', 'expected_counts', 'm_step', 'rebuild')
+
+class Metrics:
+    '''Opt-in sink for training measurements, one record per epoch.
+    A record holds the epoch number, its wall-clock seconds, the seconds
+    spent in each phase, the number of sequences and symbols processed
+    and the log likelihood of the training data under the model the
+    epoch started from.
+
+    sink -- function called with each record as its epoch ends
+    '''
+
+    def __init__(self, sink = None):
+        self.sink = sink
+        self.epochs = []
+        self.current = None
+        self.begin = None
+
+    def __repr__(self):
+        return 'Metrics({} epochs)'.format(len(self.epochs))
+
+    def __getstate__(self):
+        # the clock can't be compared across processes
+        state = dict(self.__dict__)
+        state['begin'] = None
+        return state
+
+    def start_epoch(self, epoch):
+        self.current = {'epoch': epoch, 'seconds': 0.0, 'phases': {},
+                'sequences': 0, 'symbols': 0, 'log_likelihood': 0.0}
+        self.begin = time.perf_counter()
+
+    def end_epoch(self):
+        record = self.current
+        if self.begin is not None:
+            record['seconds'] = time.perf_counter() - self.begin
+        self.current = None
+        self.record(record)
+        return record
+
+    def record(self, record):
+        '''Keep a finished epoch's record and pass it to the sink'''
+        self.epochs.append(record)
+        if self.sink:
+            self.sink(record)
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        '''Time the enclosed block and add it to the named phase'''
+        begin = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - begin)
+
+    def add_time(self, name, seconds):
+        times = self.current['phases']
+        times[name] = times.get(name, 0.0) + seconds
+
+    def add(self, name, amount):
+        '''Add to a running total of the epoch, such as sequences'''
+        self.current[name] += amount
+
+    def set(self, name, value):
+        '''Record a value of the epoch, such as a validation score'''
+        self.current[name] = value
+
+    def merge(self, record):
+        '''Fold another process's record of part of this epoch in'''
+        for name, seconds in record['phases'].items():
+            self.add_time(name, seconds)
+        for name in ('sequences', 'symbols', 'log_likelihood'):
+            self.add(name, record[name])
+
+    def summary(self):
+        '''One line per epoch, phases in running order'''
+        lines = []
+        for record in self.epochs:
+            times = record['phases']
+            names = [p for p in phases if p in times]
+            names += sorted(p for p in times if p not in phases)
+            lines.append('epoch {}: {:.3f}s, {} sequences, {} symbols, log p = {:.4f} ({})'.format(
+                    record['epoch'], record['seconds'], record['sequences'],
+                    record['symbols'], record['log_likelihood'],
+                    ', '.join('{} {:.3f}s'.format(p, times[p]) for p in names)))
+        return '\n'.join(lines)
+
+    def save(self, filename):
+        with open(filename, 'w') as f:
+            json.dump(self.epochs, f, indent = 2)
+
+def phase(metrics, name):
+    '''metrics.phase(name), or a no-op when metrics is None'''
+    if metrics is None:
+        return contextlib.nullcontext()
+    return metrics.phase(name)
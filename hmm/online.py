@@ -0,0 +1,137 @@
+#! /usr/bin/env python3
+
+import json
+import numpy as np
+from hmm.dense import CompiledModel
+from hmm.hmmio import decode_value, encode_value
+from hmm.sparse import compile_auto
+from hmm.trainer import expected_statistics
+
+class OnlineTrainer:
+    '''Stepwise EM for updating a model as new sequences arrive.
+    Keeps decayed running sums of the per-sequence Baum-Welch
+    re-estimates (the same quantities train merges each epoch) and
+    refreshes the parameters after every update.
+
+    model -- HiddenMarkovModel or compiled model to start from
+    decay -- share of the old statistics kept on each update
+    prior_weight -- how many sequences' worth of weight the starting
+        parameters get when there are no saved statistics
+    statistics -- (pi, a, b) running sums to continue from, a by edge
+    '''
+
+    def __init__(self, model, decay = 0.99, prior_weight = 0, statistics = None):
+        if not isinstance(model, CompiledModel):
+            model = compile_auto(model)
+        self.model = model
+        self.decay = decay
+        self.updates = 0
+
+        if statistics is None:
+            statistics = [prior_weight * model.pi,
+                    prior_weight * model.transition_rates(),
+                    prior_weight * model.b]
+        self.statistics = [np.array(s, dtype = float) for s in statistics]
+
+    def __repr__(self):
+        return 'OnlineTrainer({}, {} updates)'.format(self.model, self.updates)
+
+    def update(self, sequences):
+        '''Run the E-step on a mini-batch of sequences, fold it into the
+        running statistics and refresh the model
+        '''
+        totals = expected_statistics(self.model, sequences)
+        if totals is None:
+            return self.model
+
+        for statistic, total in zip(self.statistics, totals):
+            statistic *= self.decay
+            statistic += total
+        self.updates += 1
+        self.model = self.refresh()
+        return self.model
+
+    def refresh(self):
+        '''M-step: normalize the running statistics into a new model.
+        States with no statistics keep their current probabilities.
+        '''
+        model = self.model
+        pi, a, b = self.statistics
+        rows = model.edges[0]
+
+        if pi.sum():
+            pi = pi / pi.sum()
+        else:
+            pi = model.pi
+
+        totals = np.bincount(rows, weights = a, minlength = model.state_count())[rows]
+        a = np.where(totals > 0, a / np.where(totals > 0, totals, 1),
+                model.transition_rates())
+
+        totals = b.sum(axis = 1)[:, None]
+        b = np.where(totals > 0, b / np.where(totals > 0, totals, 1), model.b)
+
+        return model.with_parameters(pi, a, b)
+
+    def to_model(self):
+        return self.model.to_model()
+
+    def save(self, filename):
+        '''Write the running statistics, to keep next to the saved model.
+        The state labels, symbols and edges are saved with them so resume
+        can line the statistics up with the model it is given.
+        '''
+        pi, a, b = self.statistics
+        model = self.model
+        rows, cols = model.edges
+        layout = {
+            'labels': [encode_value(label) for label in model.labels],
+            'symbols': [encode_value(symbol) for symbol in model.symbols],
+            'edges': [[i, j] for i, j in zip(rows.tolist(), cols.tolist())],
+        }
+        np.savez(filename, pi = pi, a = a, b = b,
+                updates = self.updates, decay = self.decay,
+                layout = np.array(json.dumps(layout)))
+
+def align_statistics(model, data):
+    '''Reorder saved (pi, a, b) statistics to a compiled model's states,
+    symbols and edges; raises ValueError if they don't describe the same model'''
+    pi, a, b = data['pi'], data['a'], data['b']
+    if 'layout' not in data:
+        raise ValueError('saved statistics have no state, symbol and edge layout')
+
+    layout = json.loads(data['layout'].item())
+    labels = [decode_value(label) for label in layout['labels']]
+    symbols = [decode_value(symbol) for symbol in layout['symbols']]
+    edges = [(labels[i], labels[j]) for i, j in layout['edges']]
+
+    rows, cols = model.edges
+    model_edges = [(model.labels[i], model.labels[j])
+            for i, j in zip(rows.tolist(), cols.tolist())]
+    if (sorted(labels, key = repr) != sorted(model.labels, key = repr)
+            or sorted(symbols, key = repr) != sorted(model.symbols, key = repr)
+            or sorted(edges, key = repr) != sorted(model_edges, key = repr)):
+        raise ValueError('saved statistics are for a different model')
+
+    label_index = {label: i for i, label in enumerate(labels)}
+    symbol_index = {s: i for i, s in enumerate(symbols)}
+    state = [label_index[label] for label in model.labels]
+    symbol = [symbol_index[s] for s in model.symbols]
+    edge_index = {edge: e for e, edge in enumerate(edges)}
+    edge = [edge_index[e] for e in model_edges]
+    return pi[state], a[edge], b[state][:, symbol]
+
+def resume(model, filename, decay = None):
+    '''An OnlineTrainer continuing from statistics written by save
+
+    model -- the model the statistics were saved with
+    decay -- overrides the saved decay
+    '''
+    if not isinstance(model, CompiledModel):
+        model = compile_auto(model)
+    data = np.load(filename)
+    if decay is None:
+        decay = data['decay'].item()
+    trainer = OnlineTrainer(model, decay, statistics = align_statistics(model, data))
+    trainer.updates = data['updates'].item()
+    return trainer
@@ -0,0 +1,119 @@
+#! /usr/bin/env python3
+
+import numpy as np
+from hmm.dense import CompiledModel, DenseModel, model_arrays
+
+def segments(keys, count):
+    '''Order that groups edges by key, plus each group's start and size'''
+    order = np.argsort(keys, kind = 'stable')
+    sizes = np.bincount(keys, minlength = count)
+    starts = np.zeros(count, dtype = np.intp)
+    np.cumsum(sizes[:-1], out = starts[1:])
+    return order, starts, sizes
+
+def reduce_segments(ufunc, values, starts, sizes, empty):
+    '''Reduce the last axis of values over consecutive segments.
+    Segments of size 0 get the value empty.
+    '''
+    output = np.full(values.shape[:-1] + (len(starts),), empty, dtype = values.dtype)
+    filled = sizes > 0
+    if values.shape[-1]:
+        output[..., filled] = ufunc.reduceat(values, starts[filled], axis = -1)
+    return output
+
+class SparseModel(CompiledModel):
+    '''Compiled model that stores only the declared transitions, so each
+    time step costs O(transitions) instead of O(states ** 2).
+    Edges are kept grouped by source (CSR) for the backward pass and by
+    destination (CSC) for the forward pass and Viterbi; banded models
+    such as make_linear_model are just CSR with a fixed row width.
+
+    rates -- probability of each edge, in edge order
+    '''
+
+    def __init__(self, labels, symbols, pi, edges, rates, b):
+        CompiledModel.__init__(self, labels, symbols, pi, b, edges)
+        self.rates = np.asarray(rates, dtype = float)
+        self.log_rates = None
+
+        rows, cols = self.edges
+        states = len(self.labels)
+        by_row, self.row_starts, self.row_sizes = segments(rows, states)
+        by_col, self.col_starts, self.col_sizes = segments(cols, states)
+
+        self.row_cols = cols[by_row]
+        self.row_rates = self.rates[by_row]
+        self.col_rows = rows[by_col]
+        self.col_rates = self.rates[by_col]
+        self.col_targets = cols[by_col]
+        # predecessor of each edge, with a trailing 0 for states nothing reaches
+        self.col_sources = np.append(self.col_rows, 0)
+
+    def with_parameters(self, pi, rates, b):
+        '''A SparseModel with the same states and edges but new probabilities'''
+        return SparseModel(self.labels, self.symbols, pi, self.edges, rates, b)
+
+    def propagate(self, vector):
+        '''Push a (batch of) state distribution(s) one step forward'''
+        return reduce_segments(np.add, vector[..., self.col_rows] * self.col_rates,
+                self.col_starts, self.col_sizes, 0)
+
+    def pullback(self, vector):
+        '''Pull a (batch of) state vector(s) one step backward'''
+        return reduce_segments(np.add, vector[..., self.row_cols] * self.row_rates,
+                self.row_starts, self.row_sizes, 0)
+
+    def transition_rates(self):
+        '''Probability of each declared transition, in edge order'''
+        return self.rates
+
+    def expected_transitions(self, forward_table, weighted):
+        '''Sum over time of forward[t, from] * a[from, to] * weighted[t, to]
+        for every edge
+        '''
+        rows, cols = self.edges
+        return np.einsum('te,te->e', forward_table[:, rows],
+                weighted[:, cols]) * self.rates
+
+    def best_predecessors(self, scores, log_space = False):
+        '''For every state, the best score reachable from a predecessor
+        and the index of that predecessor.
+
+        scores -- current scores, shape (states,) or (batch, states)
+        log_space -- add log transition rates instead of multiplying
+        '''
+        if log_space:
+            if self.log_rates is None:
+                with np.errstate(divide = 'ignore'):
+                    self.log_rates = np.log(self.col_rates)
+            candidates = scores[..., self.col_rows] + self.log_rates
+            empty = -np.inf
+        else:
+            candidates = scores[..., self.col_rows] * self.col_rates
+            empty = 0
+
+        best = reduce_segments(np.maximum, candidates,
+                self.col_starts, self.col_sizes, empty)
+
+        # the first edge reaching the best score wins, as with argmax
+        edges = len(self.col_rows)
+        position = np.where(candidates == best[..., self.col_targets],
+                np.arange(edges), edges)
+        first = reduce_segments(np.minimum, position,
+                self.col_starts, self.col_sizes, edges)
+        return best, self.col_sources[first]
+
+def compile_sparse(model):
+    '''Compile a HiddenMarkovModel into a SparseModel'''
+    labels, symbols, pi, edges, rates, b = model_arrays(model)
+    return SparseModel(labels, symbols, pi, edges, rates, b)
+
+def compile_auto(model, density = 0.25):
+    '''Compile a HiddenMarkovModel into a SparseModel when at most
+    density of the possible transitions are declared, else a DenseModel'''
+    labels, symbols, pi, edges, rates, b = model_arrays(model)
+    if len(rates) <= density * len(labels) ** 2:
+        return SparseModel(labels, symbols, pi, edges, rates, b)
+    a = np.zeros((len(labels), len(labels)))
+    a[edges] = rates
+    return DenseModel(labels, symbols, pi, a, b, edges)
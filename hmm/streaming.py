@@ -0,0 +1,88 @@
+#! /usr/bin/env python3
+
+import math
+import numpy as np
+from hmm.dense import CompiledModel
+from hmm.sparse import compile_auto
+
+class ForwardFilter:
+    '''Forward algorithm that takes observations as they arrive.
+    Each observation costs one propagate step: O(states ** 2) on a
+    DenseModel, O(transitions) on a SparseModel.
+
+    model -- a compiled model, or a HiddenMarkovModel to compile
+    '''
+
+    def __init__(self, model):
+        if not isinstance(model, CompiledModel):
+            model = compile_auto(model)
+        self.model = model
+        self.reset()
+
+    def __repr__(self):
+        return 'ForwardFilter({} observations, log p = {})'.format(
+                self.length, self.log_likelihood)
+
+    def reset(self):
+        '''Forget every observation seen so far'''
+        self.belief = None
+        self.log_likelihood = 0.0
+        self.length = 0
+
+    def copy(self):
+        '''An independent filter in the same state, for branching hypotheses'''
+        other = ForwardFilter(self.model)
+        other.belief = None if self.belief is None else self.belief.copy()
+        other.log_likelihood = self.log_likelihood
+        other.length = self.length
+        return other
+
+    def update(self, observation):
+        '''Take one observation and return the log probability so far'''
+        model = self.model
+        index = model.symbol_index.get(observation)
+        if index is None:
+            rates = np.zeros(model.state_count())
+        else:
+            rates = model.b[:, index]
+
+        if self.belief is None:
+            column = model.pi * rates
+        else:
+            column = model.propagate(self.belief) * rates
+
+        scale = column.sum().item()
+        if scale:
+            self.log_likelihood += math.log(scale)
+            column /= scale
+        else:
+            self.log_likelihood = -math.inf
+        self.belief = column
+        self.length += 1
+        return self.log_likelihood
+
+    def extend(self, observations):
+        '''Take a chunk of observations and return the log probability so far'''
+        for observation in observations:
+            self.update(observation)
+        return self.log_likelihood
+
+    def is_possible(self):
+        return self.log_likelihood > -math.inf
+
+    def distribution(self):
+        '''Filtered probability of each state given everything seen so far'''
+        belief = self.model.pi if self.belief is None else self.belief
+        return dict(zip(self.model.labels, belief.tolist()))
+
+def make_filters(models):
+    '''A ForwardFilter for each model in a dict of name -> model'''
+    return {name: ForwardFilter(model) for name, model in models.items()}
+
+def prune(filters, margin):
+    '''Drop the filters whose log probability is more than margin
+    below the best one; returns the remaining filters.
+    '''
+    best = max((f.log_likelihood for f in filters.values()), default = -math.inf)
+    return {name: f for name, f in filters.items()
+            if f.is_possible() and f.log_likelihood >= best - margin}
@@ -1,6 +1,11 @@
 #! /usr/bin/env python3
 
+import math
+from concurrent.futures import ProcessPoolExecutor
 from hmm.hmm import HiddenMarkovModel
+from hmm.bank import make_bank
+from hmm.metrics import Metrics, phase
+from hmm.sparse import compile_auto
 
 def make_model(states = 8, outputs = 5):
     model = HiddenMarkovModel()
@@ -59,22 +64,167 @@ def make_linear_model(states = 25, outputs = 5):
     return model
 
 
-def train(model, sequences, epochs = 1, callback = None):
+def expected_statistics(model, sequences, metrics = None):
+    '''Sum the Baum-Welch re-estimates of sequences under a compiled model.
+    Returns (pi, a, b) arrays with a indexed by edge; this is the map step
+    train runs in worker processes.
+    '''
+    totals = None
+    for sequence in sequences:
+        estimates = model.reestimate(sequence, metrics)
+        with phase(metrics, 'm_step'):
+            if totals is None:
+                totals = list(estimates)
+            else:
+                for total, estimate in zip(totals, estimates):
+                    total += estimate
+    return totals
+
+def timed_statistics(model, sequences):
+    '''expected_statistics along with the Metrics record of the work'''
+    metrics = Metrics()
+    metrics.start_epoch(None)
+    totals = expected_statistics(model, sequences, metrics)
+    return totals, metrics.current
+
+def map_reduce_epoch(model, sequences, pool, chunk_size, metrics = None):
+    '''One training epoch with the E-step spread over a process pool.
+    Phase times measured in the workers are summed over workers.
+    '''
+    with phase(metrics, 'compile'):
+        compiled = compile_auto(model)
+    if metrics is None:
+        futures = [pool.submit(expected_statistics, compiled, sequences[i:i + chunk_size])
+                for i in range(0, len(sequences), chunk_size)]
+    else:
+        futures = [pool.submit(timed_statistics, compiled, sequences[i:i + chunk_size])
+                for i in range(0, len(sequences), chunk_size)]
+
+    # reduce in submission order so the sums don't depend on scheduling
+    totals = None
+    for future in futures:
+        statistics = future.result()
+        if metrics is not None:
+            statistics, record = statistics
+            metrics.merge(record)
+        with phase(metrics, 'm_step'):
+            if totals is None:
+                totals = statistics
+            else:
+                for total, part in zip(totals, statistics):
+                    total += part
+
+    with phase(metrics, 'rebuild'):
+        model = HiddenMarkovModel(*compiled.to_dicts(*totals), model.typecode)
+    with phase(metrics, 'm_step'):
+        model.normalize()
+    return model
+
+def converged(previous, current, tolerance):
+    '''Whether a log likelihood improved on the previous one by less than
+    tolerance, relative to the previous one'''
+    if previous is None or math.isinf(previous):
+        return False
+    return current - previous < tolerance * abs(previous)
+
+def validation_log_likelihood(model, validation):
+    '''Total log probability of held-out sequences under a model'''
+    return compile_auto(model).log_probabilities_of_observed(validation).sum().item()
+
+def train(model, sequences, epochs = 1, callback = None, workers = None, chunk_size = None,
+        metrics = None, tolerance = None, validation = None):
+    '''Train a model with Baum-Welch
+
+    epochs -- number of epochs, or the most to run when tolerance is set
+    workers -- processes for the E-step; None or 1 runs it inline
+    chunk_size -- sequences per worker task; defaults to four tasks per worker
+    metrics -- optional Metrics that gets a record of every epoch
+    tolerance -- stop once the total log likelihood improves by less than
+        this fraction of itself from one epoch to the next
+    validation -- held-out sequences; the model that scores best on them,
+        the final one included, is returned, and with tolerance their log
+        likelihood rather than the training one decides when to stop
+    '''
+
+    pool = None
+    if workers and workers > 1:
+        sequences = list(sequences)
+        pool = ProcessPoolExecutor(workers)
+        if not chunk_size:
+            chunk_size = max(1, math.ceil(len(sequences) / (4 * workers)))
+
+    # the log likelihood comes out of the E-step's metrics
+    if tolerance is not None and metrics is None:
+        metrics = Metrics()
+    previous = None
+    best = None
+
+    try:
+        for i in range(epochs):
+            if callback:
+                callback(i)
+            print(i)
+            if metrics is not None:
+                metrics.start_epoch(i)
+
+            if validation is not None:
+                score = validation_log_likelihood(model, validation)
+                if metrics is not None:
+                    metrics.set('validation_log_likelihood', score)
+                stop = (tolerance is not None and best is not None
+                        and converged(best[0], score, tolerance))
+                if best is None or score > best[0]:
+                    best = (score, model)
+                if stop:
+                    if metrics is not None:
+                        metrics.current = None
+                    break
+
+            if pool:
+                model = map_reduce_epoch(model, sequences, pool, chunk_size, metrics)
+            else:
+                model = inline_epoch(model, sequences, metrics)
+
+            if metrics is not None:
+                record = metrics.end_epoch()
+                if tolerance is not None and validation is None:
+                    if converged(previous, record['log_likelihood'], tolerance):
+                        break
+                    previous = record['log_likelihood']
+        else:
+            # the last model trained has not been validated yet
+            if validation is not None:
+                score = validation_log_likelihood(model, validation)
+                if best is None or score > best[0]:
+                    best = (score, model)
+    finally:
+        if pool:
+            pool.shutdown()
+
+    if validation is not None:
+        return best[1]
+    return model
+
+def inline_epoch(model, sequences, metrics = None):
+    '''One training epoch in this process'''
 
     def merge(dest, source):
         for label in dest:
             dest[label] = dest[label] + source[label]
 
-    for i in range(epochs):
-        if callback:
-            callback(i)
-        print(i)
-        pi = None
-        a = None
-        b = None
-        j = 0
-        for sequence in sequences:
-            new_pi, new_a, new_b = model.baum_welsch(sequence)
+    pi = None
+    a = None
+    b = None
+    for sequence in sequences:
+        # baum_welsch, one phase at a time
+        with phase(metrics, 'forward'):
+            forward_table, scales = model.scaled_forward(sequence)
+        with phase(metrics, 'backward'):
+            backward_table = model.scaled_backward(sequence, scales)
+        with phase(metrics, 'expected_counts'):
+            counts = model.expected_counts(sequence, forward_table, backward_table)
+        with phase(metrics, 'm_step'):
+            new_pi, new_a, new_b = model.reestimate(*counts)
             if not pi:
                 pi = new_pi
                 a = new_a
@@ -83,13 +233,65 @@ def train(model, sequences, epochs = 1, callback = None):
                 merge(pi, new_pi)
                 merge(a, new_a)
                 merge(b, new_b)
-            j += 1
-        model = HiddenMarkovModel(pi, a, b)
+        if metrics is not None:
+            metrics.add('sequences', 1)
+            metrics.add('symbols', len(sequence))
+            metrics.add('log_likelihood',
+                    model.log_probability_of_observed(sequence, scales))
+    with phase(metrics, 'rebuild'):
+        model = HiddenMarkovModel(pi, a, b, model.typecode)
+    with phase(metrics, 'm_step'):
         model.normalize()
-
     return model
 
-def get_success_rate(label, data_sets, hmms, maximize = lambda model, length, prob: 1):
+def train_job(model, sequences, epochs, timed, tolerance, validation):
+    '''train for one train_all job in a worker, sending back the epoch
+    records when timed'''
+    metrics = Metrics() if timed else None
+    model = train(model, sequences, epochs, metrics = metrics,
+            tolerance = tolerance, validation = validation)
+    return model, metrics.epochs if timed else None
+
+def train_all(jobs, epochs = 1, workers = None, metrics = None, tolerance = None,
+        validation = None):
+    '''Train independent models in parallel, one process per job.
+    With tolerance set, each model stops on its own once it converges.
+
+    jobs -- dict of label -> (model, sequences)
+    epochs -- passed to train for every job
+    workers -- number of processes; defaults to the CPU count, 1 trains inline
+    metrics -- optional dict of label -> Metrics for the jobs to record into
+    tolerance -- passed to train for every job
+    validation -- optional dict of label -> held-out sequences for train
+    Returns a dict of label -> trained model, in the order of jobs.
+    '''
+    if metrics is None:
+        metrics = {}
+    if validation is None:
+        validation = {}
+    if workers == 1:
+        return {label: train(model, sequences, epochs, metrics = metrics.get(label),
+                    tolerance = tolerance, validation = validation.get(label))
+                for label, (model, sequences) in jobs.items()}
+
+    with ProcessPoolExecutor(workers) as pool:
+        # workers record into their own Metrics; sinks may not pickle
+        futures = {label: pool.submit(train_job, model, sequences, epochs,
+                    label in metrics, tolerance, validation.get(label))
+                for label, (model, sequences) in jobs.items()}
+        models = {}
+        for label, future in futures.items():
+            models[label], records = future.result()
+            for record in records or ():
+                metrics[label].record(record)
+        return models
+
+def get_success_rate(label, data_sets, hmms, maximize = lambda model, length, prob: 1, bank = None):
+    '''(correct, total) for sequences of label classified against hmms
+
+    bank -- make_bank(hmms), built here if not given; pass one in to share
+            it across calls
+    '''
     count = 0
     correct = 0
 
@@ -97,14 +299,20 @@ def get_success_rate(label, data_sets, hmms, maximize = lambda model, length, pr
 
     #max_probs = {label: hmm.get_extreme_probability(observation_length, maximizer) for label, hmm in hmms.items()}
 
-    for observed in data_sets:
+    # score every sequence against every model in one batched pass
+    if bank is None:
+        bank = make_bank(hmms)
+    scores = bank.score_all(data_sets)
+
+    for i, observed in enumerate(data_sets):
 
         best_label = None
-        max_prob = 0
+        max_prob = -math.inf
 
-        for name, model in hmms.items():
-            prob = model.probability_of_observed(observed)
-            prob /= maximize(model, length, prob)
+        # compare log probabilities; raw ones underflow on long sequences
+        for j, (name, model) in enumerate(hmms.items()):
+            prob = scores[i, j].item()
+            prob -= math.log(maximize(model, length, prob))
             if prob > max_prob:
                 max_prob = prob
                 best_label = name
@@ -1,5 +1,6 @@
 #! /usr/bin/env python3
 
+import numpy as np
 from PIL import Image, ImageEnhance
 
 identity = lambda x: x
@@ -7,16 +8,20 @@ identity = lambda x: x
 def to_grid(img, f = identity):
     '''Convert an image to a 2d array.
     f -- is the mapping function. Should take one parameter: (r, g, b)
-    Note: This is painfully slow :(
+    Note: This calls f once per pixel; to_array is the fast way.
     '''
     w, h = img.size
     pixel_data = list(img.getdata())
-    grid = [[f(pixel_data[x + w * y]) for x in range(w)] for y in range(h)]
+    return [[f(p) for p in pixel_data[y * w:(y + 1) * w]] for y in range(h)]
 
-    for y in range(h):
-        for x in range(w):
-            grid[y][x] = f(pixel_data[x + w * y])
-    return grid
+def to_array(img):
+    '''View an image's buffer as a (rows, cols) or (rows, cols, bands)
+    numpy array; mode '1' images give booleans'''
+    return np.asarray(img)
+
+def to_arrays(images):
+    '''Stack equally sized images into a (count, rows, cols[, bands]) array'''
+    return np.stack([to_array(img) for img in images])
 
 def to_img(grid, f = identity, mode = '1'):
     '''Convert a 2d array to an image
@@ -27,15 +32,36 @@ def to_img(grid, f = identity, mode = '1'):
     h = len(grid)
     w = len(grid[0])
     img = Image.new(mode, (w, h), 0)
+    img.putdata([f(p) for row in grid for p in row])
+    return img
+
+def from_array(array, mode = '1'):
+    '''Convert a 2d numpy array to an image without a per-pixel loop
+    mode -- '1' for b/w, where nonzero is white, or 'L' for grayscale
+    '''
+    array = np.asarray(array)
+    if mode == '1':
+        return Image.fromarray(array != 0)
+    return Image.fromarray(array.astype(np.uint8), mode)
 
-    for y in range(h):
-        for x in range(w):
-            img.putpixel((x, y), f(grid[y][x]))
+def from_arrays(arrays, mode = '1'):
+    '''An image for each array of a (count, rows, cols) stack'''
+    return [from_array(array, mode) for array in arrays]
 
-    return img
+def binarize(array, threshold):
+    '''1 where a grayscale array, or stack of them, is above threshold'''
+    return (np.asarray(array) > threshold).astype(np.uint8)
+
+def to_binary_array(image, threshold):
+    '''to_binary_grid as a (rows, cols) array of 0s and 1s;
+    the bands of a color image are summed before thresholding'''
+    array = to_array(image).astype(int)
+    if array.ndim == 3:
+        array = array.sum(axis = 2)
+    return binarize(array, threshold)
 
 def to_binary_grid(image, threshold):
-    return to_grid(image, lambda p: 1 if sum(p) > threshold else 0)
+    return to_binary_array(image, threshold).tolist()
 
 def image_to_binary(image):
     return image.convert('1', None, False)
@@ -1,38 +1,60 @@
 #! /usr/bin/env python3
 
+import numpy as np
 from PIL import Image
 
 avg = lambda l: l if isinstance(l, int) else sum(l) / len(l)
 is_dark = lambda p_colors: avg(p_colors) < 100
 
+def dark_mask(image, f = is_dark):
+    '''Boolean (rows, cols) array of the pixels of an image that have data
+    f -- filter function, as for get_bounds; the default is_dark runs on
+        the image buffer instead of once per pixel
+    '''
+    if f is is_dark:
+        array = np.asarray(image)
+        if array.dtype == bool:
+            array = array * 255
+        if array.ndim == 3:
+            array = array.mean(axis = 2)
+        return array < 100
+    mask = np.fromiter((f(p) for p in image.getdata()), dtype = bool)
+    return mask.reshape(image.height, image.width)
+
+def mask_bounds(masks):
+    '''Bounds of the data in a (count, rows, cols) stack of masks, as a
+    (count, 4) array of (x_min, y_min, x_max, y_max); -1 marks a bound
+    get_bounds would not find'''
+    masks = np.asarray(masks, dtype = bool)
+    count, height, width = masks.shape
+    columns = masks.any(axis = 1)
+    rows = masks.any(axis = 2)
+
+    # x_max and y_max are searched down to index 1, never 0
+    bounds = np.stack((
+        np.where(columns.any(axis = 1), columns.argmax(axis = 1), -1),
+        np.where(rows.any(axis = 1), rows.argmax(axis = 1), -1),
+        np.where(columns[:, 1:].any(axis = 1),
+                width - 1 - columns[:, ::-1].argmax(axis = 1), -1),
+        np.where(rows[:, 1:].any(axis = 1),
+                height - 1 - rows[:, ::-1].argmax(axis = 1), -1)), axis = 1)
+    return bounds
+
+def get_bounds_batch(images, threshold = 100):
+    '''get_bounds for a (count, rows, cols) stack of grayscale images,
+    as returned by mask_bounds
+    threshold -- pixels darker than this have data
+    '''
+    return mask_bounds(np.asarray(images) < threshold)
+
 def get_bounds(image, f = is_dark):
     ''' Get the bounds of meaningful data from an image
     image -- The image
     f -- filter function; takes a tuple of rgb colors
         and must return a boolean value for if the pixel has data
     '''
-    pixel_data = list(image.getdata())
-    w = image.width
-    x_min = 0
-    y_min = 0
-    x_max = image.width
-    y_max = image.height
-
-    def find_first(range_a, range_b, index):
-        for a in range_a:
-            for b in range_b:
-                if f(pixel_data[index(a, b)]):
-                    return a
-
-    for_row = lambda x, y: x + y * w
-    for_col = lambda y, x: x + y * w
-
-    x_min = find_first(range(image.width), range(image.height), for_row)
-    x_max = find_first(range(image.width - 1, 0, -1), range(image.height), for_row)
-    y_min = find_first(range(image.height), range(image.width), for_col)
-    y_max = find_first(range(image.height - 1, 0, -1), range(image.width), for_col)
-
-    return (x_min, y_min, x_max, y_max)
+    bounds = mask_bounds(dark_mask(image, f)[None])[0]
+    return tuple(None if b < 0 else b.item() for b in bounds)
 
 def crop_and_scale(image, size, border = 1, f = is_dark, border_color = 0xffffff):
     ''' Create a cropped and scaled version of an image
@@ -48,11 +70,99 @@ def crop_and_scale(image, size, border = 1, f = is_dark, border_color = 0xffffff
     image = image.crop(bounds)
 
     adjusted_size = (size[0] - 2 * border, size[1] - 2 * border)
-    image = image.resize(adjusted_size, Image.ANTIALIAS)
+    image = image.resize(adjusted_size, Image.LANCZOS)
     output.paste(image, (border, border))
 
     return output
 
+# fixed-point precision of PIL's 8-bit resampling
+precision_bits = 22
+
+def lanczos(x):
+    '''The Lanczos-3 filter as PIL evaluates it'''
+    return np.where((-3 <= x) & (x < 3), np.sinc(x) * np.sinc(x / 3), 0)
+
+def resample_weights(starts, lengths, size, full):
+    '''The fixed-point weights PIL's LANCZOS resize applies to go from a
+    span of each line to size samples, as an (images, size, full) matrix
+
+    starts -- first index of each image's span
+    lengths -- length of each image's span
+    full -- length of the whole line
+    '''
+    count = len(starts)
+    weights = np.zeros((count, size, full))
+
+    scale = lengths / size
+    filterscale = np.maximum(scale, 1)
+    support = 3 * filterscale
+    ksize = int(np.ceil(support.max(initial = 0))) * 2 + 1
+
+    center = (np.arange(size) + 0.5) * scale[:, None]
+    first = np.maximum(np.trunc(center - support[:, None] + 0.5), 0).astype(np.intp)
+    last = np.minimum(np.trunc(center + support[:, None] + 0.5),
+            lengths[:, None]).astype(np.intp)
+
+    x = np.arange(ksize)
+    k = lanczos((x + first[..., None] - center[..., None] + 0.5)
+            * (1 / filterscale)[:, None, None])
+    valid = x < (last - first)[..., None]
+    k = np.where(valid, k, 0)
+    # PIL sums the weights in order; cumsum does too
+    total = np.cumsum(k, axis = -1)[..., -1:]
+    k = np.divide(k, total, out = k, where = total != 0)
+    k = np.trunc(np.where(k < 0, -0.5, 0.5) + k * (1 << precision_bits))
+
+    image, sample, offset = np.nonzero(valid)
+    position = starts[image] + first[image, sample] + offset
+    weights[image, sample, position] = k[image, sample, offset]
+
+    # PIL skips the pass entirely when the span already has the right size
+    same = lengths == size
+    weights[same] = 0
+    image, sample = np.nonzero(same[:, None] & np.ones(size, dtype = bool))
+    weights[image, sample, starts[image] + sample] = 1 << precision_bits
+    return weights
+
+def apply_weights(weights, values):
+    '''One 8-bit resampling pass; float64 is exact for these integer sums'''
+    total = weights @ values + (1 << (precision_bits - 1))
+    return np.clip(np.floor(total / (1 << precision_bits)), 0, 255)
+
+def crop_and_scale_batch(images, size, threshold = 100):
+    '''Crop and scale a stack of grayscale images like crop_and_scale
+    with no border, using array operations for the whole stack
+
+    images -- (count, rows, cols) uint8 array
+    size -- (width, height) of the output images
+    threshold -- pixels darker than this hold data
+    Returns a (count, height, width) array. Images with no dark pixels
+    keep their full extent, where crop_and_scale fails.
+    '''
+    images = np.asarray(images)
+    count, height, width = images.shape
+
+    # crop's right and bottom edges are exclusive, so the last dark
+    # column and row are left out, exactly as in crop_and_scale
+    x_min, y_min, x_max, y_max = get_bounds_batch(images, threshold).T
+
+    # no dark pixels: keep the whole image; a crop of zero width or
+    # height resizes to black, as it does in PIL
+    blank = (x_max < 0) | (y_max < 0)
+    empty = ~blank & ((x_max <= x_min) | (y_max <= y_min))
+    x_min[blank | empty] = 0
+    y_min[blank | empty] = 0
+    x_max[blank | empty] = width
+    y_max[blank | empty] = height
+
+    horizontal = resample_weights(x_min, x_max - x_min, size[0], width)
+    vertical = resample_weights(y_min, y_max - y_min, size[1], height)
+
+    scaled = apply_weights(images.astype(float), horizontal.transpose(0, 2, 1))
+    output = apply_weights(vertical, scaled).astype(np.uint8)
+    output[empty] = 0
+    return output
+
 if __name__ == '__main__':
     from sys import argv
 
@@ -1,5 +1,74 @@
 #! /usr/bin/env python3
 
+import numpy as np
+
+# (row, col) offset of each neighbour, clockwise from the one above;
+# bit i of a neighbourhood code is set when neighbour i is foreground
+offsets = ((-1, 0), (-1, 1), (0, 1), (1, 1), (1, 0), (1, -1), (0, -1), (-1, -1))
+
+def count_0_to_1(neighbors):
+    count = 0
+
+    prev = neighbors[-1]
+    for n in neighbors:
+        if n and not prev:
+            count += 1
+        prev = n
+
+    return count
+
+def deletion_tables():
+    '''For each of the 256 neighbourhood codes, whether a foreground
+    pixel is deleted in the odd and in the even sub-iteration'''
+    odd = np.zeros(256, dtype = bool)
+    even = np.zeros(256, dtype = bool)
+    for code in range(256):
+        n = [(code >> i) & 1 for i in range(8)]
+        if 2 <= sum(n) <= 6 and count_0_to_1(n) == 1:
+            odd[code] = not (n[0] and n[2] and n[4]) and not (n[2] and n[4] and n[6])
+            even[code] = not (n[0] and n[2] and n[6]) and not (n[0] and n[4] and n[6])
+    return odd, even
+
+odd_table, even_table = deletion_tables()
+
+def neighbor_codes(images):
+    '''8-bit neighbourhood code of every pixel of a stack of binary images;
+    pixels outside the image count as background'''
+    height, width = images.shape[-2:]
+    padded = np.pad(images, [(0, 0)] * (images.ndim - 2) + [(1, 1), (1, 1)])
+    codes = np.zeros(images.shape, dtype = np.uint8)
+    for bit, (row, col) in enumerate(offsets):
+        neighbor = padded[..., 1 + row:1 + row + height, 1 + col:1 + col + width]
+        codes |= neighbor.astype(np.uint8) << bit
+    return codes
+
+def skeletonize_array(images):
+    '''Zhang-Suen thinning of a binary image, or a stack of them, using
+    lookup tables over whole arrays. Returns a new boolean array.
+
+    images -- (rows, cols) or (count, rows, cols) array; nonzero is foreground
+    '''
+    images = np.array(images, dtype = bool)
+    stack = images.reshape((-1,) + images.shape[-2:])
+
+    # like skeletonize, each image stops at its first sub-iteration
+    # that deletes nothing
+    active = np.ones(len(stack), dtype = bool)
+    odd_iteration = False
+    while active.any():
+        odd_iteration = not odd_iteration
+        table = odd_table if odd_iteration else even_table
+
+        current = stack[active]
+        to_delete = current & table[neighbor_codes(current)]
+        changed = to_delete.any(axis = (1, 2))
+        current &= ~to_delete
+
+        stack[active] = current
+        active[active] = changed
+
+    return images
+
 def skeletonize(grid):
     '''Apply thinning to a binary grid representation of an image.
     This uses a Thinning algorithm designed by T.Y. Zhang
@@ -8,88 +77,10 @@ def skeletonize(grid):
     grid -- 2d array of 0s and 1s
     '''
 
-    width = len(grid[0])
-    height = len(grid)
-
-    def get_pixel(row, col):
-        if row < 0 or row == height or col < 0 or col == width:
-            return 0
-        else:
-            return grid[row][col]
-
-    def list_neighbors(row, col):
-        neighbors = [0 for i in range(8)]
-        neighbors[0] = get_pixel(row - 1, col)
-        neighbors[1] = get_pixel(row - 1, col + 1)
-        neighbors[2] = get_pixel(row, col + 1)
-        neighbors[3] = get_pixel(row + 1, col + 1)
-        neighbors[4] = get_pixel(row + 1, col)
-        neighbors[5] = get_pixel(row + 1, col - 1)
-        neighbors[6] = get_pixel(row, col - 1)
-        neighbors[7] = get_pixel(row - 1, col - 1)
-        return neighbors
-
-    def count_neighbors(neighbors):
-        count = 0
-        for n in neighbors:
-            if n:
-                count += 1
-        return count
-
-    def count_0_to_1(neighbors):
-        count = 0
-
-        prev = neighbors[-1]
-        for n in neighbors:
-            if n and not prev:
-                count += 1
-            prev = n
-
-        return count
-
-    def neighbor_product(neighbors, indices):
-        product = 1
-        for i in indices:
-            product *= neighbors[i - 2]
-        return product
-
-    def iteration(n, oddIteration):
-        if oddIteration:
-            if (neighbor_product(n, (2, 4, 6))
-                    or neighbor_product(n, (4, 6, 8))):
-                return False
-            else:
-                return True
-        else:
-            if (neighbor_product(n, (2, 4, 8))
-                    or neighbor_product(n, (2, 6, 8))):
-                return False
-            else:
-                return True
-
-    changed = True
-    oddIteration = False
-    i = 0
-    while changed:
-        to_delete = set()
-        i += 1
-
-        changed = False
-        oddIteration = not oddIteration
-
-        for row in range(height):
-            for col in range(width):
-                if grid[row][col]:
-                    n = list_neighbors(row, col)
-                    n_count = count_neighbors(n)
-                    if (2 <= n_count and n_count <= 6
-                            and count_0_to_1(n) == 1
-                            and iteration(n, oddIteration)):
-                        to_delete.add((row, col))
-
-        changed = len(to_delete) > 0
-        for (row, col) in to_delete:
-            grid[row][col] = 0
+    before = np.array(grid, dtype = bool)
+    after = skeletonize_array(before)
+    for row, col in zip(*np.nonzero(before & ~after)):
+        grid[row][col] = 0
 
 if __name__ == '__main__':
     import binarization
@@ -100,13 +91,11 @@ if __name__ == '__main__':
         print('use: ./skeletonize.py <image path>')
     else:
 
-        inverse = lambda i: 0 if i else 1
-
         image = Image.open(argv[1])
         image = binarization.image_to_binary(image)
         image.show()
-        grid = binarization.to_grid(image, inverse)
-        grid = [row[:] for row in grid]
 
-        skeletonize(grid)
-        binarization.to_img(grid, inverse).show()
+        # black pixels are the foreground
+        grid = ~binarization.to_array(image)
+        skeleton = skeletonize_array(grid)
+        binarization.from_array(~skeleton).show()
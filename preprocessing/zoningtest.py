@@ -1,9 +1,10 @@
 #! /usr/bin/env python3
 import sys
-sys.path.append('../hmm')
+sys.path.append('..')
 
-from trainer import train
-from hmm import HiddenMarkovModel
+from hmm.trainer import train_all
+from hmm.hmm import HiddenMarkovModel
+from hmm.bank import make_bank
 
 def make_model(states = 10, outputs = 5):
     model = HiddenMarkovModel()
@@ -49,30 +50,19 @@ if __name__ == '__main__':
             hmms[label] = make_model(14, 8)
 
         print('training')
-        for label in hmms:
-            model = hmms[label]
-            data_set = data[label]
-            epochs = 3
-
-            hmms[label] = train(model, data_set, epochs, lambda x: None)
+        max_epochs = 20
+        tolerance = 1e-3
+        hmms = train_all({label: (hmms[label], data[label]) for label in hmms},
+                max_epochs, tolerance = tolerance)
         print('training complete\n')
 
         count = 0
         correct = 0
+        bank = make_bank(hmms)
 
         for label, data_set in data.items():
 
-            for observed in data_set:
-                best_label = None
-                max_prob = 0
-
-                for name, model in hmms.items():
-                    prob = model.probability_of_observed(observed)
-
-                    if prob > max_prob:
-                        max_prob = prob
-                        best_label = name
-
+            for best_label in bank.classify_all(data_set):
                 print('{}: {}'.format(label, best_label))
                 count += 1
                 if label == best_label:
@@ -1,6 +1,7 @@
 #! /usr/bin/env python3
 
-from preprocessing.scaling import crop_and_scale
+import numpy as np
+from preprocessing.scaling import crop_and_scale, crop_and_scale_batch
 from PIL import Image
 
 def avg(array):
@@ -25,6 +26,21 @@ def get_values(image, size, states = 5):
     pixels = quantize(pixels, states)
     return pixels
 
+def get_values_batch(images, size, states = 5, chunk_size = 4096):
+    '''get_values for a stack of grayscale images, one row per image
+
+    images -- (count, rows, cols) uint8 array, e.g. from read_images
+    chunk_size -- images resampled at once, bounding memory use
+    '''
+    images = np.asarray(images)
+    values = np.empty((len(images), size[0] * size[1]), dtype = int)
+    for start in range(0, len(images), chunk_size):
+        chunk = crop_and_scale_batch(images[start:start + chunk_size], size)
+        pixels = chunk.reshape(len(chunk), -1).astype(float)
+        step = (pixels.max(axis = 1, keepdims = True) + 1) / states
+        values[start:start + len(chunk)] = pixels / step
+    return values
+
 if __name__ == '__main__':
     from sys import argv
     import os
@@ -1,12 +1,19 @@
 #! /usr/bin/env python3
 
-from preprocessing.zoningwriter import get_values
-from hmm.trainer import make_model, train, get_success_rate
-from utils.mnstreader import get_image_data, get_labels
+from preprocessing.zoningwriter import get_values, get_values_batch
+from hmm.trainer import make_model, train_all, get_success_rate
+from hmm.bank import make_bank
+from hmm.metrics import Metrics
+from utils.mnstreader import read_images, get_labels
+from utils.featurecache import FeatureCache, source_version
 from PIL import Image
 import hmm.trainer as trainer
+import preprocessing.scaling as scaling
+import preprocessing.zoningwriter as zoningwriter
+import utils.mnstreader as mnstreader
 from time import time
-from utils.softmax import softmax, softmax_denom, softmax_numerator
+
+feature_cache = FeatureCache(version = source_version(zoningwriter, scaling, mnstreader))
 
 def zone(image_data, shade_count, image_size, resample_size):
     img = Image.new('L', image_size)
@@ -29,14 +36,16 @@ def show_image(data, size):
     img.show()
 
 def get_data_sets(image_file, label_file, count, resample_size):
-    images, size = get_image_data(image_file, count)
     labels = get_labels(label_file)[:count]
 
-    data_sets = {}
-    for i in range(count):
-        label = labels[i]
-        image = zone(images[i], shade_count, size, resample_size)
+    def compute(start, stop):
+        images = read_images(image_file, stop - start, start)
+        return get_values_batch(images, resample_size, shade_count)
+
+    features = feature_cache.get(image_file, count, shade_count, resample_size, compute)
 
+    data_sets = {}
+    for label, image in zip(labels, features.tolist()):
         if label in data_sets:
             data_sets[label].append(image)
         else:
@@ -45,11 +54,16 @@ def get_data_sets(image_file, label_file, count, resample_size):
 
 def train_models(data_sets, hmms):
     begin = time()
-    iterations = 2
-    for label in data_sets:
-        print('training: {}'.format(label))
-        hmms[label] = train(hmms[label], data_sets[label], iterations)
+    max_epochs = 20
+    tolerance = 1e-3
+    print('training: {}'.format(', '.join(str(label) for label in data_sets)))
+    metrics = {label: Metrics() for label in data_sets}
+    hmms = train_all({label: (hmms[label], data_sets[label]) for label in data_sets},
+            max_epochs, metrics = metrics, tolerance = tolerance)
 
+    for label in data_sets:
+        print('{}:'.format(label))
+        print(metrics[label].summary())
     print('runtime: ', time() - begin, 's')
     return hmms
 
@@ -57,8 +71,9 @@ def run_tests(data_sets, hmms):
     total_count = 0
     total_correct = 0
     rates = {}
+    bank = make_bank(hmms)
     for label, data in test_data_sets.items():
-        (correct, total) = get_success_rate(label, data, hmms)
+        (correct, total) = get_success_rate(label, data, hmms, bank = bank)
         rates[label] = correct / total
 
         print('{}: {} / {}'.format(label, correct, total))
@@ -95,7 +110,6 @@ if __name__ == '__main__':
         # initialize data and hmms
         generate_model = lambda: trainer.make_2d_model(hmm_size, hmm_size, 1, shade_count)
         data_sets = get_data_sets(image_file, label_file, count, resample_size)
-        test_data_sets = get_data_sets(test_image_file, test_label_file, test_count, resample_size)
         hmms = {label: generate_model() for label in data_sets}
 
         # train and test
@@ -0,0 +1,80 @@
+#! /usr/bin/env python3
+
+import numpy as np
+import os
+import random
+import sys
+import tempfile
+
+sys.path.append('..')
+from hmm.bank import make_bank
+from hmm.hmm import HiddenMarkovModel
+from hmm.hmmio import load_bank, load_models, save_bank
+from hmm.trainer import get_success_rate, make_2d_model, make_linear_model, train
+
+random.seed(0)
+sequences = [[random.randrange(5) for i in range(random.randrange(5, 60))]
+        for j in range(20)]
+models = {
+    'grid': make_2d_model(3, 3, 1),
+    'linear': make_linear_model(6),
+    'trained': train(make_2d_model(2, 2, 1), sequences[:5], 1, lambda i: None),
+}
+bank = make_bank(models)
+
+expected = np.array([[model.log_probability_of_observed(s)
+        for model in models.values()] for s in sequences])
+computed = bank.score_all(sequences, 8)
+
+passed = np.allclose(expected, computed, rtol = 1e-9)
+passed &= np.allclose(expected[0], bank.score(sequences[0]), rtol = 1e-9)
+
+names = list(models)
+passed &= bank.classify(sequences[0]) == names[expected[0].argmax()]
+best = [name for name, _ in bank.top_k(sequences[0], 2)]
+passed &= best == [names[i] for i in np.argsort(-expected[0])[:2]]
+passed &= np.isclose(bank.model('linear').log_probability_of_observed(sequences[0]),
+        expected[0][1])
+
+# a bank built once and passed in classifies like one built per call
+passed &= get_success_rate('grid', sequences, models, bank = bank) == \
+        get_success_rate('grid', sequences, models)
+passed &= get_success_rate('grid', sequences, models)[0] == \
+        sum(names[row.argmax()] == 'grid' for row in expected)
+
+# string and integer labels survive the binary format
+models['3'] = models.pop('trained')
+models[7] = models.pop('grid')
+filename = os.path.join(tempfile.mkdtemp(), 'bank.hmm')
+save_bank(models.items(), filename)
+expected = make_bank(models).score_all(sequences)
+for mmap in (True, False):
+    loaded = load_bank(filename, mmap)
+    passed &= loaded.names == ['linear', '3', 7]
+    passed &= np.allclose(expected, loaded.score_all(sequences), rtol = 1e-12)
+
+loaded = load_models(filename)
+passed &= np.isclose(loaded['3'].log_probability_of_observed(sequences[0]),
+        models['3'].log_probability_of_observed(sequences[0]), rtol = 1e-12)
+
+# tuple state labels and numpy scalar names come back hashable and equal
+grid = make_2d_model(2, 2, 1)
+tupled = HiddenMarkovModel(
+        {(s.element // 2, s.element % 2): p for s, p in grid.initial_states},
+        {((f // 2, f % 2), (t.element // 2, t.element % 2)): p
+            for f, state in grid.state_map.items() for t, p in state.transitions},
+        {((f // 2, f % 2), o): p
+            for f, state in grid.state_map.items() for o, p in state.emissions})
+save_bank([(np.uint8(4), tupled)], filename)
+loaded = load_bank(filename)
+passed &= loaded.names == [4] and loaded.labels == [list(tupled.state_map)]
+passed &= np.isclose(loaded.model(4).log_probability_of_observed(sequences[0]),
+        tupled.log_probability_of_observed(sequences[0]), rtol = 1e-12)
+
+try:
+    save_bank([(object(), grid)], filename)
+    passed = False
+except TypeError:
+    pass
+
+print('pass' if passed else 'fail')
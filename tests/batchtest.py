@@ -0,0 +1,31 @@
+#! /usr/bin/env python3
+
+import numpy as np
+import random
+import sys
+
+sys.path.append('..')
+from hmm.dense import compile_model
+from hmm.sparse import compile_sparse
+from hmm.trainer import make_2d_model
+
+random.seed(0)
+model = make_2d_model(4, 4, 1)
+sequences = [[random.randrange(5) for i in range(random.randrange(1, 80))]
+        for j in range(40)]
+sequences.append([0, 1, 'unseen', 2])
+
+expected = [model.log_probability_of_observed(s) for s in sequences]
+
+decoded = [model.log_viterbi(s) for s in sequences[:-1]]
+
+passed = True
+for compiled in (compile_model(model), compile_sparse(model)):
+    computed = compiled.log_probabilities_of_observed(sequences, 8)
+    passed &= np.allclose(expected, computed, rtol = 1e-9)
+
+    computed = compiled.viterbi_all(sequences[:-1], 8)
+    passed &= [path for path, _ in decoded] == [path for path, _ in computed]
+    passed &= np.allclose([p for _, p in decoded], [p for _, p in computed], rtol = 1e-9)
+
+print('pass' if passed else 'fail')
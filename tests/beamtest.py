@@ -0,0 +1,37 @@
+#! /usr/bin/env python3
+
+import math
+import random
+import sys
+
+sys.path.append('..')
+from hmm.trainer import make_2d_model, train
+
+def close(a, b):
+    return abs(a - b) <= 1e-9 * max(abs(a), abs(b))
+
+random.seed(0)
+sequences = [[random.randrange(5) for i in range(60)] for j in range(6)]
+model = train(make_2d_model(6, 6, 1), sequences, 2, lambda i: None)
+observed = sequences[0]
+
+# without pruning the beam versions are exact
+path, log_prob = model.log_viterbi(observed)
+beam_path, beam_prob, bound = model.beam_viterbi(observed)
+passed = path == beam_path and close(log_prob, beam_prob) and bound == -math.inf
+
+expected = model.log_probability_of_observed(observed)
+beam_prob, upper = model.beam_forward(observed)
+passed &= close(expected, beam_prob) and close(expected, upper)
+
+# with pruning the bounds must hold
+for margin, width in ((5, None), (None, 4), (2, 3)):
+    beam_path, beam_prob, bound = model.beam_viterbi(observed, margin, width)
+    passed &= beam_prob <= log_prob + 1e-9
+    if bound < beam_prob:
+        passed &= close(beam_prob, log_prob)
+
+    beam_prob, upper = model.beam_forward(observed, margin, width)
+    passed &= beam_prob <= expected + 1e-9 <= upper + 2e-9
+
+print('pass' if passed else 'fail')
@@ -0,0 +1,31 @@
+#! /usr/bin/env python3
+
+import random
+import sys
+import numpy as np
+from PIL import Image
+
+sys.path.append('..')
+from preprocessing.binarization import (binarize, from_array, to_array,
+        to_binary_array, to_binary_grid, to_grid, to_img)
+
+random.seed(0)
+pixels = [tuple(random.randrange(256) for band in range(3)) for i in range(6 * 4)]
+image = Image.new('RGB', (6, 4))
+image.putdata(pixels)
+
+passed = True
+expected = [[1 if sum(p) > 380 else 0 for p in pixels[row * 6:(row + 1) * 6]]
+        for row in range(4)]
+passed &= to_binary_grid(image, 380) == expected
+passed &= to_grid(image) == [pixels[row * 6:(row + 1) * 6] for row in range(4)]
+passed &= to_array(image).shape == (4, 6, 3)
+
+binary = to_binary_array(image, 380)
+passed &= np.array_equal(to_array(from_array(binary)), to_array(to_img(expected)))
+passed &= np.array_equal(to_array(from_array(binary * 200, 'L')), binary * 200)
+
+stack = np.array([to_array(image.convert('L'))] * 3)
+passed &= binarize(stack, 100).shape == (3, 4, 6)
+
+print('pass' if passed else 'fail')
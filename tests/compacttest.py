@@ -0,0 +1,38 @@
+#! /usr/bin/env python3
+
+import pickle
+import random
+import sys
+
+sys.path.append('..')
+from hmm.hmm import ProbabilityPair
+from hmm.trainer import make_2d_model
+
+random.seed(0)
+model = make_2d_model(4, 4, 1)
+observed = [random.randrange(5) for i in range(30)]
+
+passed = True
+state = model.get_state(0)
+passed &= not hasattr(state, '__dict__')
+passed &= not hasattr(state.transitions, '__dict__')
+passed &= not hasattr(iter(state.transitions), '__dict__')
+passed &= state.transitions.rates.typecode == 'd'
+
+compact = model.with_typecode('f')
+passed &= compact.get_state(5).emissions.rates.typecode == 'f'
+passed &= compact.initial_states.rates.typecode == 'f'
+passed &= abs(compact.log_probability_of_observed(observed)
+        - model.log_probability_of_observed(observed)) < 1e-4
+passed &= pickle.loads(pickle.dumps(compact)).get_state(5).emissions.rates.typecode == 'f'
+
+pair = ProbabilityPair('f')
+for element, probability in (('a', 1), ('b', 2), ('a', 5)):
+    pair.add(element, probability)
+pair.normalize()
+passed &= pair.get_total_probability() == 1.0
+passed &= pair.probability('a') == pair.rates[0] and pair.probability('c') == 0
+pair.clear()
+passed &= pair.is_empty() and pair.rates.typecode == 'f'
+
+print('pass' if passed else 'fail')
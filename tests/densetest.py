@@ -0,0 +1,43 @@
+#! /usr/bin/env python3
+
+from toyexample import make_model
+from hmm.dense import compile_model
+from hmm.trainer import make_2d_model
+
+def close(a, b):
+    return abs(a - b) <= 1e-9 * max(abs(a), abs(b), 1e-300)
+
+def tables_match(expected, computed):
+    return all(close(row[label], computed_row[label])
+            for row, computed_row in zip(expected, computed)
+            for label in row)
+
+def dicts_match(expected, computed):
+    return (expected.keys() == computed.keys()
+            and all(close(expected[k], computed[k]) for k in expected))
+
+passed = True
+for model, observed in ((make_model(), list('GGCACTGAA')),
+        (make_2d_model(3, 3, 1), [0, 1, 4, 2, 2, 3, 0, 1])):
+    dense = compile_model(model)
+
+    passed &= tables_match(model.forward(observed),
+            dense.to_table(dense.forward(observed)))
+    passed &= tables_match(model.backward(observed),
+            dense.to_table(dense.backward(observed)))
+    passed &= close(model.probability_of_observed(observed),
+            dense.probability_of_observed(observed))
+
+    path, prob = model.viterbi(observed)
+    dense_path, dense_prob = dense.viterbi(observed)
+    passed &= path == dense_path and close(prob, dense_prob)
+
+    for expected, computed in zip(model.baum_welsch(observed),
+            dense.baum_welsch(observed)):
+        passed &= dicts_match(expected, computed)
+
+    rebuilt = dense.to_model()
+    passed &= close(model.probability_of_observed(observed),
+            rebuilt.probability_of_observed(observed))
+
+print('pass' if passed else 'fail')
@@ -0,0 +1,71 @@
+#! /usr/bin/env python3
+
+import contextlib
+import io
+import random
+import sys
+
+sys.path.append('..')
+from hmm.metrics import Metrics
+from hmm.trainer import make_2d_model, train, train_all, validation_log_likelihood
+
+def sample():
+    return [random.choice((0, 0, 0, 1, 2)) if t < 10 else random.choice((3, 4, 4))
+            for t in range(20)]
+
+random.seed(0)
+sequences = [sample() for i in range(30)]
+validation = [sample() for i in range(10)]
+
+capped = Metrics()
+stopped = Metrics()
+held_out = Metrics()
+with contextlib.redirect_stdout(io.StringIO()):
+    train(make_2d_model(3, 3, 1), sequences, 30, metrics = capped)
+    model = train(make_2d_model(3, 3, 1), sequences, 30, metrics = stopped, tolerance = 1e-3)
+    train(make_2d_model(3, 3, 1), sequences, 30, metrics = held_out,
+            tolerance = 1e-3, validation = validation)
+    models = train_all({'a': (make_2d_model(3, 3, 1), sequences)}, 30, workers = 1,
+            tolerance = 1e-3)
+
+passed = True
+passed &= len(capped.epochs) == 30
+passed &= 1 < len(stopped.epochs) < 30
+passed &= 1 < len(held_out.epochs) < 30
+passed &= all('validation_log_likelihood' in record for record in held_out.epochs)
+
+# the last epoch is the first to improve by less than the tolerance
+likelihoods = [record['log_likelihood'] for record in stopped.epochs]
+passed &= likelihoods[-1] - likelihoods[-2] < 1e-3 * abs(likelihoods[-2])
+passed &= all(b - a >= 1e-3 * abs(a) for a, b in zip(likelihoods[:-2], likelihoods[1:-1]))
+
+passed &= all(models['a'].transition_probability(f, t) == model.transition_probability(f, t)
+        for f in range(9) for t in range(9))
+
+# validation picks the best model even when the epoch cap is reached
+# first, the final model included, and works without a tolerance
+def noisy(p):
+    return [random.choice((0, 0, 0, 1, 2)) if t < 10 and random.random() < p
+            else random.choice((3, 4, 4)) if random.random() < p
+            else random.randrange(5) for t in range(20)]
+
+def same(a, b):
+    return all(a.transition_probability(f, t) == b.transition_probability(f, t)
+            for f in range(9) for t in range(9))
+
+random.seed(1)
+peaked = [noisy(0.95) for i in range(10)]
+random.seed(2)
+uniform = [noisy(0) for i in range(10)]
+with contextlib.redirect_stdout(io.StringIO()):
+    candidates = [train(make_2d_model(3, 3, 1), sequences, epochs) for epochs in range(4)]
+    capped = train(make_2d_model(3, 3, 1), sequences, 3, tolerance = 1e-12,
+            validation = peaked)
+    untimed = train(make_2d_model(3, 3, 1), sequences, 3, validation = uniform)
+
+for held, model in ((peaked, capped), (uniform, untimed)):
+    scores = [validation_log_likelihood(m, held) for m in candidates]
+    best = scores.index(max(scores))
+    passed &= best < 3 and same(model, candidates[best])
+
+print('pass' if passed else 'fail')
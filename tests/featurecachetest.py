@@ -0,0 +1,75 @@
+#! /usr/bin/env python3
+
+import os
+import sys
+import tempfile
+import numpy as np
+
+sys.path.append('..')
+from utils.featurecache import FeatureCache
+
+directory = tempfile.mkdtemp()
+image_file = os.path.join(directory, 'images-idx3-ubyte')
+images = np.random.default_rng(0).integers(0, 256, (10, 4, 4), dtype = np.uint8)
+with open(image_file, 'wb') as f:
+    f.write(bytes((0, 0, 8, 3)))
+    for size in images.shape:
+        f.write(size.to_bytes(4, byteorder = 'big'))
+    f.write(images.tobytes())
+
+calls = []
+def compute(start, stop):
+    calls.append((start, stop))
+    return images[start:stop, :2, :2].reshape(stop - start, 4) // 64
+
+cache = FeatureCache(os.path.join(directory, 'cache'))
+passed = True
+
+# a miss computes everything, a full hit computes nothing
+first = cache.get(image_file, 4, 5, (2, 2), compute)
+passed &= calls == [(0, 4)] and np.array_equal(first, compute(0, 4))
+calls.clear()
+passed &= np.array_equal(cache.get(image_file, 3, 5, (2, 2), compute), first[:3])
+passed &= calls == []
+
+# a partial hit computes only the tail
+features = cache.get(image_file, 7, 5, (2, 2), compute)
+passed &= calls == [(4, 7)] and np.array_equal(features, compute(0, 7)[:7])
+calls.clear()
+
+# asking for more images than the file holds stops at the end, and once
+# everything is cached nothing is recomputed or rewritten
+path = cache.path(image_file, 5, (2, 2))
+features = cache.get(image_file, 12, 5, (2, 2), compute)
+passed &= calls == [(7, 10)] and np.array_equal(features, compute(0, 10))
+calls.clear()
+written = os.stat(path).st_ino
+features = cache.get(image_file, 12, 5, (2, 2), compute)
+passed &= calls == [] and len(features) == 10 and os.stat(path).st_ino == written
+
+# other parameters or another code version are separate entries
+cache.get(image_file, 2, 3, (2, 2), compute)
+passed &= calls == [(0, 2)]
+calls.clear()
+other = FeatureCache(cache.directory, version = 'changed')
+other.get(image_file, 2, 5, (2, 2), compute)
+passed &= calls == [(0, 2)]
+passed &= len({cache.path(image_file, 5, (2, 2)), cache.path(image_file, 3, (2, 2)),
+        other.path(image_file, 5, (2, 2))}) == 3
+
+# least recently used entries go first once max_bytes is exceeded
+old = other.path(image_file, 5, (2, 2))
+recent = cache.path(image_file, 3, (2, 2))
+os.utime(old, (1, 1))
+os.utime(recent, (2, 2))
+os.utime(path, (3, 3))
+cache.get(image_file, 2, 3, (2, 2), compute)
+sizes = [os.path.getsize(p) for p in (path, recent)]
+cache.max_bytes = sum(sizes) + os.path.getsize(old) - 1
+cache.evict()
+passed &= not os.path.exists(old) and os.path.exists(recent) and os.path.exists(path)
+
+cache.clear()
+passed &= os.listdir(cache.directory) == []
+
+print('pass' if passed else 'fail')
@@ -0,0 +1,58 @@
+#! /usr/bin/env python3
+
+import contextlib
+import io
+import random
+import sys
+
+sys.path.append('..')
+from hmm.metrics import Metrics
+from hmm.trainer import make_2d_model, train, train_all
+
+def close(a, b):
+    return abs(a - b) <= 1e-9 * max(abs(a), abs(b))
+
+if __name__ == '__main__':
+    random.seed(0)
+    model = make_2d_model(3, 3, 1)
+    sequences = [[random.randrange(5) for t in range(20)] for i in range(12)]
+
+    records = []
+    inline = Metrics(records.append)
+    pooled = Metrics()
+    with contextlib.redirect_stdout(io.StringIO()):
+        plain = train(model, sequences, 2)
+        trained = train(model, sequences, 2, metrics = inline)
+        train(model, sequences, 2, workers = 2, metrics = pooled)
+
+    passed = True
+    passed &= records == inline.epochs and len(records) == 2
+    passed &= all(trained.transition_probability(f, t) == plain.transition_probability(f, t)
+            for f in range(9) for t in range(9))
+    for a, b in zip(inline.epochs, pooled.epochs):
+        passed &= a['sequences'] == b['sequences'] == 12
+        passed &= a['symbols'] == b['symbols'] == 240
+        passed &= close(a['log_likelihood'], b['log_likelihood'])
+        passed &= all(name in a['phases'] for name in
+                ('forward', 'backward', 'expected_counts', 'm_step', 'rebuild'))
+        passed &= 'compile' in b['phases'] and b['seconds'] > 0
+
+    first = sum(model.log_probability_of_observed(s) for s in sequences)
+    passed &= close(inline.epochs[0]['log_likelihood'], first)
+    passed &= inline.epochs[1]['log_likelihood'] >= inline.epochs[0]['log_likelihood']
+    passed &= len(inline.summary().splitlines()) == 2
+
+    # with a pool, the caller's Metrics are filled and their sinks called here
+    jobs = {'x': (model, sequences[:6]), 'y': (model, sequences[6:])}
+    seen = []
+    metrics = {label: Metrics(lambda record, label = label: seen.append((label, record)))
+            for label in jobs}
+    originals = dict(metrics)
+    with contextlib.redirect_stdout(io.StringIO()):
+        train_all(jobs, 2, workers = 2, metrics = metrics)
+    passed &= all(metrics[label] is originals[label] for label in jobs)
+    passed &= all(len(metrics[label].epochs) == 2 for label in jobs)
+    passed &= [label for label, record in seen] == ['x', 'x', 'y', 'y']
+    passed &= seen[0][1] is metrics['x'].epochs[0]
+
+    print('pass' if passed else 'fail')
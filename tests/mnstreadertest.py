@@ -0,0 +1,55 @@
+#! /usr/bin/env python3
+
+import os
+import sys
+import tempfile
+import numpy as np
+
+sys.path.append('..')
+from utils.mnstreader import get_image_data, get_labels, read_images, read_labels
+
+def write_idx(filename, array):
+    array = np.ascontiguousarray(array, dtype = np.uint8)
+    with open(filename, 'wb') as f:
+        f.write(bytes((0, 0, 8, array.ndim)))
+        for size in array.shape:
+            f.write(size.to_bytes(4, byteorder = 'big'))
+        f.write(array.tobytes())
+
+def read_bytes(filename, header, count):
+    '''The values the byte-at-a-time reader returned'''
+    with open(filename, 'rb') as f:
+        f.read(header)
+        return list(f.read(count))
+
+rng = np.random.default_rng(0)
+images = rng.integers(0, 256, (7, 4, 3), dtype = np.uint8)
+labels = rng.integers(0, 10, 7, dtype = np.uint8)
+directory = tempfile.mkdtemp()
+image_file = os.path.join(directory, 'images-idx3-ubyte')
+label_file = os.path.join(directory, 'labels-idx1-ubyte')
+write_idx(image_file, images)
+write_idx(label_file, labels)
+
+passed = True
+values = read_bytes(image_file, 16, 7 * 12)
+for count in (-1, 0, 3, 7):
+    data, size = get_image_data(image_file, count)
+    expected = values[:12 * (7 if count < 0 else count)]
+    passed &= size == (4, 3)
+    passed &= data == [[255 - v for v in expected[12 * k:12 * (k + 1)]]
+            for k in range(len(expected) // 12)]
+passed &= get_labels(label_file) == read_bytes(label_file, 8, 7)
+
+for mmap in (True, False):
+    for count, offset, expected in ((-1, 0, images), (3, 2, images[2:5]),
+            (10, 5, images[5:]), (-1, 6, images[6:]), (0, 0, images[:0]),
+            (4, 7, images[:0]), (2, 20, images[:0])):
+        read = read_images(image_file, count, offset, invert = False, mmap = mmap)
+        passed &= read.shape == expected.shape and np.array_equal(read, expected)
+        read = read_images(image_file, count, offset, mmap = mmap)
+        passed &= np.array_equal(read, 255 - expected)
+        read = read_labels(label_file, count, offset, mmap = mmap)
+        passed &= np.array_equal(read, labels[offset:][:len(expected)])
+
+print('pass' if passed else 'fail')
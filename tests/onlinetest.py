@@ -0,0 +1,85 @@
+#! /usr/bin/env python3
+
+import numpy as np
+import os
+import random
+import sys
+import tempfile
+
+sys.path.append('..')
+from hmm.dense import DenseModel
+from hmm.hmm import HiddenMarkovModel
+from hmm.online import OnlineTrainer, resume
+from hmm.sparse import compile_auto
+from hmm.trainer import make_2d_model, train
+
+random.seed(0)
+sequences = [[random.randrange(5) for i in range(40)] for j in range(12)]
+test = sequences[0]
+
+# with no decay, one update over everything is one epoch of train
+online = OnlineTrainer(make_2d_model(3, 3, 1), decay = 1)
+online.update(sequences)
+batch = train(make_2d_model(3, 3, 1), sequences, 1, lambda i: None)
+passed = np.isclose(online.model.log_probability_of_observed(test),
+        batch.log_probability_of_observed(test), rtol = 1e-9)
+
+# saved statistics continue exactly where they left off
+online = OnlineTrainer(make_2d_model(3, 3, 1), decay = 0.9)
+online.update(sequences[:6])
+filename = os.path.join(tempfile.mkdtemp(), 'stats.npz')
+online.save(filename)
+resumed = resume(online.model, filename)
+
+online.update(sequences[6:])
+resumed.update(sequences[6:])
+passed &= resumed.updates == 2
+passed &= np.isclose(online.model.log_probability_of_observed(test),
+        resumed.to_model().log_probability_of_observed(test), rtol = 1e-9)
+
+# statistics resume against a model whose states, symbols and edges
+# are stored in another order
+letters = 'abcde'
+grid = make_2d_model(3, 3, 1)
+model = HiddenMarkovModel(
+        {s.element: p for s, p in grid.initial_states},
+        {(f, t.element): p for f, state in grid.state_map.items() for t, p in state.transitions},
+        {(f, letters[o]): p for f, state in grid.state_map.items() for o, p in state.emissions})
+text = [[letters[o] for o in s] for s in sequences]
+passed &= compile_auto(model).symbols == list(letters)
+
+online = OnlineTrainer(model, decay = 0.9)
+online.update(text[:6])
+online.save(filename)
+
+trained = online.model
+order = [4, 0, 3, 1, 2]
+last = trained.state_count() - 1
+rows, cols = trained.edges
+a = np.zeros((last + 1, last + 1))
+a[last - rows, last - cols] = trained.transition_rates()
+shuffled = DenseModel(trained.labels[::-1], [trained.symbols[k] for k in order],
+        trained.pi[::-1], a, trained.b[::-1][:, order], (last - rows, last - cols))
+resumed = resume(shuffled, filename)
+
+online.update(text[6:])
+resumed.update(text[6:])
+passed &= np.isclose(online.model.log_probability_of_observed(text[0]),
+        resumed.model.log_probability_of_observed(text[0]), rtol = 1e-9)
+
+try:
+    resume(make_2d_model(2, 2, 1), filename)
+    passed = False
+except ValueError:
+    pass
+
+# statistics without a layout can't be lined up, so they are refused
+np.savez(filename, pi = trained.pi, a = trained.transition_rates(), b = trained.b,
+        updates = 1, decay = 0.9)
+try:
+    resume(trained, filename)
+    passed = False
+except ValueError:
+    pass
+
+print('pass' if passed else 'fail')
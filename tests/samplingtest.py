@@ -0,0 +1,30 @@
+#! /usr/bin/env python3
+
+import random
+import sys
+
+sys.path.append('..')
+from hmm.hmm import ProbabilityPair
+from toyexample import make_model
+
+random.seed(0)
+pair = ProbabilityPair()
+for element, probability in (('a', 1), ('b', 0), ('c', 3), ('d', 6)):
+    pair.add(element, probability)
+pair.normalize()
+
+draws = 100000
+counts = {element: 0 for element in 'abcd'}
+for i in range(draws):
+    counts[pair.get_random()] += 1
+
+passed = counts['b'] == 0
+for element, probability in pair:
+    passed &= abs(counts[element] / draws - probability) < 0.01
+
+# every draw must produce a symbol, so sequences run to full length
+model = make_model()
+passed &= all(len(model.get_sequence(50)) == 50 for i in range(100))
+passed &= ProbabilityPair().get_random() is None
+
+print('pass' if passed else 'fail')
@@ -0,0 +1,42 @@
+#! /usr/bin/env python3
+
+import math
+import random
+from toyexample import make_model
+from hmm.dense import compile_model
+from hmm.trainer import make_2d_model
+
+def close(a, b):
+    return abs(a - b) <= 1e-9 * max(abs(a), abs(b))
+
+passed = True
+model = make_model()
+dense = compile_model(model)
+observed = list('GGCACTGAA')
+
+# scaling must not change the answers on short sequences
+expected = math.log(model.probability_of_observed(observed))
+passed &= close(expected, model.log_probability_of_observed(observed))
+passed &= close(expected, dense.log_probability_of_observed(observed))
+
+path, prob = model.viterbi(observed)
+for log_path, log_prob in (model.log_viterbi(observed),
+        dense.log_viterbi(observed)):
+    passed &= path == log_path and close(math.log(prob), log_prob)
+
+# 784 symbols underflow the unscaled forward algorithm
+model = make_2d_model(5, 5, 1)
+dense = compile_model(model)
+random.seed(0)
+observed = [random.randrange(5) for i in range(28 * 28)]
+
+passed &= model.probability_of_observed(observed) == 0
+log_prob = model.log_probability_of_observed(observed)
+passed &= math.isfinite(log_prob)
+passed &= close(log_prob, dense.log_probability_of_observed(observed))
+passed &= close(model.log_viterbi(observed)[1], dense.log_viterbi(observed)[1])
+
+pi, a, b = model.baum_welsch(observed)
+passed &= all(math.isfinite(p) for p in b.values())
+
+print('pass' if passed else 'fail')
@@ -0,0 +1,28 @@
+#! /usr/bin/env python3
+
+import random
+import sys
+import numpy as np
+
+sys.path.append('..')
+from preprocessing.skeletonize import skeletonize, skeletonize_array
+
+random.seed(0)
+bar = [[1 if 2 <= row <= 5 and 1 <= col <= 10 else 0 for col in range(12)]
+        for row in range(8)]
+grid = [row[:] for row in bar]
+skeletonize(grid)
+
+passed = True
+passed &= sum(map(sum, grid)) < sum(map(sum, bar))
+passed &= all(grid[row][col] <= bar[row][col] for row in range(8) for col in range(12))
+
+grids = [[[int(random.random() < 0.6) for col in range(12)] for row in range(8)]
+        for i in range(10)]
+stack = skeletonize_array(np.array(grids))
+for before, after in zip(grids, stack):
+    skeletonize(before)
+    passed &= np.array_equal(np.array(before, dtype = bool), after)
+passed &= np.array_equal(skeletonize_array(bar), np.array(grid, dtype = bool))
+
+print('pass' if passed else 'fail')
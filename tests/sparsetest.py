@@ -0,0 +1,38 @@
+#! /usr/bin/env python3
+
+import numpy as np
+import random
+import sys
+
+sys.path.append('..')
+from hmm.dense import compile_model
+from hmm.sparse import compile_sparse
+from hmm.trainer import make_2d_model, make_linear_model
+
+def close(a, b):
+    return np.allclose(a, b, rtol = 1e-9, atol = 0)
+
+passed = True
+random.seed(0)
+for model in (make_2d_model(6, 6, 1), make_linear_model(12)):
+    dense = compile_model(model)
+    sparse = compile_sparse(model)
+    observed = [random.randrange(5) for i in range(60)]
+
+    passed &= close(dense.forward(observed), sparse.forward(observed))
+    passed &= close(dense.backward(observed), sparse.backward(observed))
+    passed &= close(dense.log_probability_of_observed(observed),
+            sparse.log_probability_of_observed(observed))
+
+    for expected, computed in zip(dense.reestimate(observed),
+            sparse.reestimate(observed)):
+        passed &= close(expected, computed)
+
+    for expected, computed in ((dense.viterbi(observed), sparse.viterbi(observed)),
+            (dense.log_viterbi(observed), sparse.log_viterbi(observed))):
+        passed &= expected[0] == computed[0] and close(expected[1], computed[1])
+
+    passed &= close(model.log_probability_of_observed(observed),
+            sparse.to_model().log_probability_of_observed(observed))
+
+print('pass' if passed else 'fail')
@@ -0,0 +1,39 @@
+#! /usr/bin/env python3
+
+import math
+import random
+import sys
+
+sys.path.append('..')
+from hmm.streaming import ForwardFilter, make_filters, prune
+from hmm.trainer import make_2d_model, make_model
+
+def close(a, b):
+    return abs(a - b) <= 1e-9 * max(abs(a), abs(b))
+
+random.seed(0)
+model = make_2d_model(4, 4, 1)
+observed = [random.randrange(5) for i in range(300)]
+
+stream = ForwardFilter(model)
+passed = True
+for t in (1, 50, 300):
+    stream.extend(observed[stream.length:t])
+    passed &= close(stream.log_likelihood,
+            model.log_probability_of_observed(observed[:t]))
+
+table, scales = model.scaled_forward(observed)
+distribution = stream.distribution()
+passed &= all(close(p, distribution[label]) for label, p in table[-1].items())
+
+filters = make_filters({'grid': model, 'full': make_model(4, 4)})
+for observation in observed[:20]:
+    for f in filters.values():
+        f.update(observation)
+filters = prune(filters, 0)
+passed &= list(filters) == ['grid']
+
+stream.update('unseen')
+passed &= not stream.is_possible() and stream.log_likelihood == -math.inf
+
+print('pass' if passed else 'fail')
@@ -1,13 +1,13 @@
 import sys
 
-sys.path.append('../hmm')
-import hmm
+sys.path.append('..')
+from hmm.hmm import HiddenMarkovModel
 
 '''Sample data taken from
 http://homepages.ulb.ac.be/~dgonze/TEACHING/viterbi.pdf'''
 
 def make_model():
-    model = hmm.HiddenMarkovModel()
+    model = HiddenMarkovModel()
 
     h = 'H'
     l = 'L'
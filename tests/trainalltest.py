@@ -0,0 +1,50 @@
+#! /usr/bin/env python3
+
+import contextlib
+import io
+import pickle
+import random
+import sys
+
+sys.path.append('..')
+from hmm.trainer import make_2d_model, make_linear_model, train, train_all
+
+if __name__ == '__main__':
+    random.seed(0)
+    labels = ['c', 'a', 'b']
+    jobs = {label: (make_2d_model(3, 3, 1),
+            [[random.randrange(5) for t in range(15)] for i in range(6)])
+            for label in labels}
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        inline = train_all(jobs, 2, workers = 1)
+        pooled = train_all(jobs, 2, workers = 2)
+
+    passed = True
+    passed &= list(pooled) == labels and list(inline) == labels
+    for label in labels:
+        passed &= all(abs(pooled[label].transition_probability(f, t)
+                - inline[label].transition_probability(f, t)) <= 1e-12
+                for f in range(9) for t in range(9))
+
+    # a pooled epoch gives the same model as an inline one
+    model, sequences = jobs['a']
+    with contextlib.redirect_stdout(io.StringIO()):
+        inline = train(model, sequences, 3)
+        pooled = train(model, sequences, 3, workers = 2, chunk_size = 2)
+    passed &= all(abs(pooled.transition_probability(f, t)
+            - inline.transition_probability(f, t)) <= 1e-12
+            for f in range(9) for t in range(9))
+    passed &= all(abs(pooled.get_state(s).emit_rate(o)
+            - inline.get_state(s).emit_rate(o)) <= 1e-12
+            for s in range(9) for o in range(5))
+
+    # chains of State references would exhaust the recursion limit here
+    model = make_linear_model(3000)
+    copy = pickle.loads(pickle.dumps(model))
+    passed &= list(copy.state_map) == list(model.state_map)
+    passed &= all(abs(copy.transition_probability(s, t) - model.transition_probability(s, t)) <= 1e-15
+            for s in (0, 1500, 2999) for t in range(s, min(3000, s + 4)))
+    passed &= abs(copy.get_state(42).emit_rate(3) - model.get_state(42).emit_rate(3)) <= 1e-15
+
+    print('pass' if passed else 'fail')
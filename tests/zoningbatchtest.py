@@ -0,0 +1,32 @@
+#! /usr/bin/env python3
+
+import sys
+import numpy as np
+from PIL import Image
+
+sys.path.append('..')
+from preprocessing.scaling import get_bounds, get_bounds_batch
+from preprocessing.zoningwriter import get_values, get_values_batch
+
+rng = np.random.default_rng(0)
+images = np.full((40, 28, 28), 255, dtype = np.uint8)
+for image in images:
+    height, width = rng.integers(2, 28, 2)
+    y, x = rng.integers(0, 28 - height + 1), rng.integers(0, 28 - width + 1)
+    image[y:y + height, x:x + width] = rng.integers(0, 256, (height, width))
+    image[y, x] = 0
+    image[y + height - 1, x + width - 1] = 0
+
+passed = True
+bounds = get_bounds_batch(images)
+for image, row in zip(images, bounds):
+    passed &= get_bounds(Image.fromarray(image)) == tuple(row.tolist())
+
+for size in ((7, 7), (4, 6), (28, 28)):
+    values = get_values_batch(images, size, 5, chunk_size = 16)
+    for image, row in zip(images, values):
+        img = Image.new('L', (28, 28))
+        img.putdata(image.ravel().tolist())
+        passed &= row.tolist() == get_values(img, size, 5)
+
+print('pass' if passed else 'fail')
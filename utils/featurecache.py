@@ -0,0 +1,115 @@
+#! /usr/bin/env python3
+
+import hashlib
+import inspect
+import json
+import os
+import numpy as np
+from utils.mnstreader import read_header
+
+default_directory = os.path.join('.', 'cache', 'features')
+fingerprints = {}
+
+def fingerprint(filename):
+    '''Hash of a file's contents, remembered while its size and mtime hold'''
+    stat = os.stat(filename)
+    key = (os.path.abspath(filename), stat.st_size, stat.st_mtime_ns)
+    if key not in fingerprints:
+        digest = hashlib.sha1()
+        with open(filename, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        fingerprints[key] = digest.hexdigest()
+    return fingerprints[key]
+
+def source_version(*modules):
+    '''Hash of the source of the modules that produce the features'''
+    digest = hashlib.sha1()
+    for module in modules:
+        digest.update(inspect.getsource(module).encode('utf-8'))
+    return digest.hexdigest()
+
+class FeatureCache:
+    '''On-disk cache of zoned feature sequences.
+    Entries are keyed by the dataset file's contents, the preprocessing
+    parameters and the preprocessing code version, and hold one uint8
+    row per image in dataset order, so a longer request reuses the rows
+    already cached and only computes the rest.
+
+    directory -- where entries are stored
+    max_bytes -- least recently used entries are evicted above this size
+    version -- preprocessing code version; see source_version
+    '''
+
+    def __init__(self, directory = default_directory, max_bytes = 1 << 30, version = ''):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.version = version
+
+    def path(self, filename, shade_count, resample_size):
+        key = json.dumps([fingerprint(filename), shade_count,
+                list(resample_size), self.version])
+        name = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, name + '.npy')
+
+    def get(self, filename, count, shade_count, resample_size, compute):
+        '''Features of the first count images of a dataset file; count is
+        capped at the number of images in the file, -1 takes them all
+
+        compute -- function of (start, stop) returning the feature rows
+            of images start to stop - 1 for whatever is not cached yet
+        '''
+        path = self.path(filename, shade_count, resample_size)
+        if os.path.exists(path):
+            cached = np.load(path, mmap_mode = 'r')
+        else:
+            cached = np.zeros((0, resample_size[0] * resample_size[1]), dtype = np.uint8)
+
+        # never ask for more images than the dataset holds
+        total = read_header(filename, 1)[1][0]
+        if count < 0 or count > total:
+            count = total
+
+        if len(cached) >= count:
+            if os.path.exists(path):
+                os.utime(path)
+            return np.array(cached[:count])
+
+        rows = np.asarray(compute(len(cached), count), dtype = np.uint8)
+        if not len(rows):
+            return np.array(cached)
+        features = np.concatenate((cached, rows.reshape(len(rows), -1)))
+        del cached
+
+        # write under a temporary name so readers never see half a file
+        os.makedirs(self.directory, exist_ok = True)
+        temporary = path + '.tmp'
+        with open(temporary, 'wb') as f:
+            np.save(f, features)
+        os.replace(temporary, path)
+        self.evict(path)
+        return features
+
+    def evict(self, keep = None):
+        '''Remove least recently used entries until the cache fits max_bytes'''
+        entries = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.endswith('.npy') and path != keep:
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        if keep:
+            total += os.path.getsize(keep)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= size
+
+    def clear(self):
+        if os.path.isdir(self.directory):
+            for name in os.listdir(self.directory):
+                if name.endswith('.npy'):
+                    os.remove(os.path.join(self.directory, name))
@@ -1,46 +1,62 @@
 #! /usr/bin/env python3
 
+import numpy as np
 from PIL import Image
 
-def get_image_data(filename, count = -1):
-    f = open(filename, 'rb')
-
-    def next(num_bytes = 1):
-        x = f.read(num_bytes)
-        return int.from_bytes(x, byteorder='big')
-
-    magic_number = next(4)
-
-    if count < 0:
-        count = next(4)
-    else:
-        next(4)
-
-    rows = next(4)
-    cols = next(4)
-
-    output = [
-        [255 - next() for i in range(rows * cols)] for k in range(count)
-    ]
+def read_header(filename, dimensions):
+    '''Read the magic number and dimension sizes of an IDX file'''
+    with open(filename, 'rb') as f:
+        data = f.read(4 * (dimensions + 1))
+    values = [int.from_bytes(data[i:i + 4], byteorder='big')
+            for i in range(0, len(data), 4)]
+    return values[0], values[1:]
+
+def read_array(filename, dimensions, count, offset, mmap):
+    '''Items of an IDX file as a uint8 array, without copying when mmap is set
+
+    dimensions -- number of dimensions in the file, including the item count
+    count -- number of items to read; -1 reads to the end
+    offset -- number of items to skip
+    '''
+    magic_number, sizes = read_header(filename, dimensions)
+    total, shape = sizes[0], tuple(sizes[1:])
+    offset = min(offset, total)
+    if count < 0 or offset + count > total:
+        count = total - offset
+
+    item_size = int(np.prod(shape, dtype = np.int64))
+    start = 4 * (dimensions + 1) + offset * item_size
+    if mmap and count:
+        return np.memmap(filename, dtype = np.uint8, mode = 'r',
+                offset = start, shape = (count,) + shape)
+
+    with open(filename, 'rb') as f:
+        f.seek(start)
+        data = np.fromfile(f, dtype = np.uint8, count = count * item_size)
+    return data.reshape((count,) + shape)
+
+def read_images(filename, count = -1, offset = 0, invert = True, mmap = True):
+    '''Images of an IDX file as a (count, rows, cols) uint8 array
+
+    invert -- return 255 - x, as get_image_data does; this makes a copy
+    mmap -- map the file rather than reading it
+    '''
+    images = read_array(filename, 3, count, offset, mmap)
+    if invert:
+        return 255 - images
+    return images
+
+def read_labels(filename, count = -1, offset = 0, mmap = True):
+    '''Labels of an IDX file as a uint8 array'''
+    return read_array(filename, 1, count, offset, mmap)
 
-    f.close()
-    return output, (rows, cols)
+def get_image_data(filename, count = -1):
+    images = read_images(filename, count, mmap = False)
+    rows, cols = images.shape[1:]
+    return images.reshape(len(images), rows * cols).tolist(), (rows, cols)
 
 def get_labels(filename):
-
-    f = open(filename, 'rb')
-
-    def next(num_bytes = 1):
-        x = f.read(num_bytes)
-        return int.from_bytes(x, byteorder='big')
-
-    magic_number = next(4)
-
-    count = next(4)
-    output = [next() for i in range(count)]
-
-    f.close()
-    return output
+    return read_labels(filename, mmap = False).tolist()
 
 if __name__ == '__main__':
     label_file = 'train-labels-idx1-ubyte'